@@ -0,0 +1,123 @@
+"""
+Seeded synthetic data for the benchmarks: random tag DAGs and time-log histories,
+written in the CSV formats read by tags.sync.import_from_csv and
+timelog.loaders.load_from_csv.
+"""
+import csv
+import datetime
+import random
+from pathlib import Path
+from typing import Dict, Iterator, List
+
+from tags.sync import CsvTag
+from timelog.loaders.load_from_csv import TIMESTAMP_FORMAT
+from timelog.timelog_entry import TimeLogEntry
+
+
+def generate_tag_dag(
+    tag_count: int,
+    depth: int,
+    fan_out: int,
+    multi_parent_ratio: float,
+    rng: random.Random
+) -> List[CsvTag]:
+    """
+    Random tag hierarchy below a single root tag.
+
+    Tags are added level by level, each tag of a level getting between 1 and
+    2 * fan_out - 1 children (fan_out on average), until tag_count tags exist or
+    depth levels are full. A fraction multi_parent_ratio of the tags get one
+    extra parent from a shallower level, which keeps the graph acyclic.
+
+    Args:
+        tag_count: Number of tags to generate, root included
+        depth: Maximum number of levels below the root
+        fan_out: Mean number of children per tag
+        multi_parent_ratio: Fraction of tags with a second parent, in [0, 1]
+        rng: Random source
+
+    Returns:
+        The tags, parents before children, without IDs
+    """
+    tags = [CsvTag(id=None, name="root", ancestor_names=[])]
+    shallower: List[str] = ["root"]
+    level = ["root"]
+    for _ in range(depth):
+        next_level: List[str] = []
+        for parent_name in level:
+            for _ in range(rng.randint(1, 2 * fan_out - 1)):
+                if len(tags) >= tag_count:
+                    break
+                name = f"tag{len(tags)}"
+                ancestor_names = [parent_name]
+                if rng.random() < multi_parent_ratio:
+                    extra_parent = rng.choice(shallower)
+                    if extra_parent != parent_name:
+                        ancestor_names.append(extra_parent)
+                tags.append(CsvTag(id=None, name=name, ancestor_names=ancestor_names))
+                next_level.append(name)
+        if not next_level:
+            break
+        shallower.extend(next_level)
+        level = next_level
+    return tags
+
+
+def write_tags_csv(csv_path: Path, tags: List[CsvTag]):
+    with open(csv_path, 'w', newline='', encoding='utf-8') as f:
+        writer = csv.writer(f)
+        writer.writerow(['id', 'name', 'direct_ancestors'])
+        for tag in tags:
+            writer.writerow(['' if tag.id is None else tag.id, tag.name, ' '.join(tag.ancestor_names)])
+
+
+def generate_time_logs(
+    entry_count: int,
+    tag_names: List[str],
+    rng: random.Random,
+    start: datetime.datetime = datetime.datetime(2020, 1, 1, 8, 0, 0)
+) -> Iterator[TimeLogEntry]:
+    """
+    Random, chronologically ordered time-log entries.
+
+    Each entry lasts 5 minutes to 3 hours, follows the previous one after a gap
+    of up to 2 hours, and has 1 to 3 tags. Tags are drawn with Zipf-like
+    weights, so a few tags cover most entries as in real logs.
+
+    Args:
+        entry_count: Number of entries to generate
+        tag_names: Tags to draw from
+        rng: Random source
+        start: Start of the first entry
+    """
+    weights = [1 / rank for rank in range(1, len(tag_names) + 1)]
+    current = start
+    for index in range(entry_count):
+        duration = datetime.timedelta(minutes=rng.randint(5, 180))
+        tags = list(dict.fromkeys(rng.choices(tag_names, weights, k=rng.randint(1, 3))))
+        yield TimeLogEntry(start=current, duration=duration, tags=tags, description=f"entry {index}")
+        current += duration + datetime.timedelta(minutes=rng.randint(0, 120))
+
+
+def write_time_logs_csv(csv_paths: List[Path], entries: Iterator[TimeLogEntry]) -> Dict[Path, int]:
+    """
+    Write entries round-robin in chunks of 1000 across csv_paths, in the
+    headerless format of load_from_csv. Returns the number of rows per file.
+    """
+    files = [open(csv_path, 'w', newline='', encoding='utf-8') for csv_path in csv_paths]
+    counts = {csv_path: 0 for csv_path in csv_paths}
+    try:
+        writers = [csv.writer(f) for f in files]
+        for index, entry in enumerate(entries):
+            file_index = index // 1000 % len(files)
+            writers[file_index].writerow([
+                entry.start.strftime(TIMESTAMP_FORMAT),
+                int(entry.duration.total_seconds()),
+                ' '.join(entry.tags),
+                entry.description,
+            ])
+            counts[csv_paths[file_index]] += 1
+    finally:
+        for f in files:
+            f.close()
+    return counts
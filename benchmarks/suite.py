@@ -0,0 +1,207 @@
+"""
+End-to-end benchmarks of the tags and timelog code paths at several scales.
+
+For every scale, a seeded tag DAG and time-log history are generated into a
+temporary directory, then each benchmark is timed --repeat times on them.
+Results are printed as a table and, with --output, written as JSON so runs on
+different commits can be compared.
+"""
+import argparse
+import datetime
+import json
+import os
+import platform
+import random
+import statistics
+import subprocess
+import tempfile
+import time
+from pathlib import Path
+from typing import Callable, Dict, List, Optional
+
+from benchmarks import generate
+from common import connection
+from tags import bulk_sync, db as tags_db, sync
+from tags.tag import Tag
+from tags.utils import tree
+from tags.validation import validate_tag
+from timelog import db as timelog_db
+from timelog.loaders import load_from_csv
+from timelog.show_stats import by_tag_analysis
+
+# Number of tags and of time-log entries of each scale.
+SCALES = {
+    "small": (200, 10_000),
+    "medium": (2_000, 100_000),
+    "large": (20_000, 1_000_000),
+}
+
+VALIDATED_TAGS = 1000
+TIME_LOG_FILES = 4
+
+
+def parse_args():
+    p = argparse.ArgumentParser(description="Benchmark tags and timelog at several scales")
+    p.add_argument(
+        "--scales", dest="scales",
+        nargs="+", choices=SCALES, default=["small", "medium"],
+        help="Scales to run",
+    )
+    p.add_argument(
+        "--repeat", dest="repeat",
+        type=int, default=3,
+        help="Number of timed runs per benchmark",
+    )
+    p.add_argument(
+        "--seed", dest="seed",
+        type=int, default=0,
+        help="Random seed for the synthetic data",
+    )
+    p.add_argument(
+        "--depth", dest="depth",
+        type=int, default=6,
+        help="Maximum depth of the tag hierarchy",
+    )
+    p.add_argument(
+        "--fan-out", dest="fan_out",
+        type=int, default=6,
+        help="Mean number of children per tag",
+    )
+    p.add_argument(
+        "--multi-parent-ratio", dest="multi_parent_ratio",
+        type=float, default=0.1,
+        help="Fraction of tags with a second parent",
+    )
+    p.add_argument(
+        "--output", dest="output",
+        type=Path, default=None,
+        help="JSON file to write the results to",
+    )
+    return p.parse_args()
+
+
+def measure(run: Callable[[], object], repeat: int, setup: Optional[Callable[[], object]] = None) -> List[float]:
+    """Wall-clock seconds of each of repeat calls to run, each preceded by an untimed setup."""
+    times = []
+    for _ in range(repeat):
+        if setup is not None:
+            setup()
+        started = time.perf_counter()
+        run()
+        times.append(time.perf_counter() - started)
+    return times
+
+
+def _fresh_db(db_path: Path):
+    connection.close_connection(db_path)
+    for suffix in ("", "-wal", "-shm"):
+        Path(f"{db_path}{suffix}").unlink(missing_ok=True)
+    timelog_db.init_db(db_path)
+
+
+def _validate_sample(db_path: Path, tags: List[Tag]):
+    with tags_db.transaction(db_path, dry_run=True) as conn:
+        for tag in tags:
+            validate_tag(conn, tag)
+
+
+def _show_tree(db_path: Path):
+    with tags_db.transaction(db_path, dry_run=True) as conn, open(os.devnull, 'w') as out:
+        tree.show_tree(conn, 1, out=out)
+
+
+def _load_time_logs(db_path: Path, csv_paths: List[Path]):
+    errors: List[str] = []
+    timelog_db.add_entries(db_path, load_from_csv.parse_files(csv_paths, os.cpu_count(), errors))
+
+
+def run_scale(args, scale: str, tmp_dir: Path) -> List[Dict]:
+    tag_count, entry_count = SCALES[scale]
+    rng = random.Random(args.seed)
+    csv_tags = generate.generate_tag_dag(tag_count, args.depth, args.fan_out, args.multi_parent_ratio, rng)
+    tags_csv = tmp_dir / "tags.csv"
+    generate.write_tags_csv(tags_csv, csv_tags)
+    time_log_csvs = [tmp_dir / f"time_logs_{index}.csv" for index in range(TIME_LOG_FILES)]
+    generate.write_time_logs_csv(
+        time_log_csvs,
+        generate.generate_time_logs(entry_count, [tag.name for tag in csv_tags], rng)
+    )
+    db_path = tmp_dir / "bench.db"
+    sizes = {"tags": len(csv_tags), "entries": entry_count}
+
+    results = []
+
+    def record(name: str, times: List[float]):
+        results.append({
+            "scale": scale,
+            "benchmark": name,
+            **sizes,
+            "times": times,
+            "best": min(times),
+            "median": statistics.median(times),
+        })
+        print(f"{scale:<8}  {name:<24}  {min(times):>10.4f}  {statistics.median(times):>10.4f}")
+
+    record("import_from_csv", measure(lambda: sync.import_from_csv(db_path, tags_csv), args.repeat, lambda: _fresh_db(db_path)))
+    record("import_from_csv_bulk", measure(lambda: bulk_sync.import_from_csv(db_path, tags_csv), args.repeat, lambda: _fresh_db(db_path)))
+    record("export_to_csv", measure(lambda: sync.export_to_csv(db_path, tmp_dir / "export.csv"), args.repeat))
+    record("export_to_csv_stream", measure(lambda: sync.export_to_csv(db_path, tmp_dir / "export.csv", stream=True), args.repeat))
+
+    with tags_db.transaction(db_path, dry_run=True) as conn:
+        stored_tags = tags_db.get_all_tags(conn)
+    sample = random.Random(args.seed).sample(stored_tags, min(VALIDATED_TAGS, len(stored_tags)))
+    record("validate_tag", measure(lambda: _validate_sample(db_path, sample), args.repeat))
+    record("show_tree", measure(lambda: _show_tree(db_path), args.repeat))
+
+    record(
+        "load_from_csv",
+        measure(lambda: _load_time_logs(db_path, time_log_csvs), args.repeat, lambda: timelog_db.clear_all_entries(db_path))
+    )
+    record("query_all_entries", measure(lambda: timelog_db.query_all_entries(db_path), args.repeat))
+    entries = timelog_db.query_all_entries(db_path)
+    record("by_tag_analysis", measure(lambda: by_tag_analysis(entries), args.repeat))
+
+    connection.close_connection(db_path)
+    return results
+
+
+def _git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "HEAD"],
+            capture_output=True, text=True, check=True, cwd=Path(__file__).parent
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main():
+    args = parse_args()
+
+    print(f"{'scale':<8}  {'benchmark':<24}  {'best (s)':>10}  {'median (s)':>10}")
+    results = []
+    for scale in args.scales:
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            results.extend(run_scale(args, scale, Path(tmp_dir)))
+
+    if args.output is not None:
+        report = {
+            "commit": _git_commit(),
+            "date": datetime.datetime.now().isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "parameters": {
+                "seed": args.seed,
+                "repeat": args.repeat,
+                "depth": args.depth,
+                "fan_out": args.fan_out,
+                "multi_parent_ratio": args.multi_parent_ratio,
+            },
+            "results": results,
+        }
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
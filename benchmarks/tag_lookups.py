@@ -0,0 +1,95 @@
+"""
+Benchmark tag relationship lookups before and after the index migration.
+
+Builds a synthetic DAG with the requested number of direct edges, times
+get_direct_ancestors_ids / get_direct_descendants_ids on random tags against the
+bare schema.sql tables, then applies the index migration and times them again.
+"""
+import argparse
+import random
+import sqlite3
+import tempfile
+import time
+from pathlib import Path
+from typing import Callable, List
+
+from tags import db, migrations
+
+EDGES_PER_TAG = 4
+
+
+def parse_args():
+    p = argparse.ArgumentParser(description="Benchmark tag relationship lookups before/after indexing")
+    p.add_argument(
+        "--edges", dest="edges",
+        type=int, nargs="+", default=[10_000, 100_000, 1_000_000],
+        help="Numbers of edges to benchmark with",
+    )
+    p.add_argument(
+        "--lookups", dest="lookups",
+        type=int, default=200,
+        help="Number of lookups timed per function",
+    )
+    p.add_argument(
+        "--seed", dest="seed",
+        type=int, default=0,
+        help="Random seed for the synthetic graph",
+    )
+    return p.parse_args()
+
+
+def build_graph(conn: sqlite3.Connection, edges: int, rng: random.Random) -> int:
+    """Insert a random DAG with the given number of direct edges. Returns the number of tags."""
+    conn.executescript(open(Path(db.__file__).parent / "schema.sql").read())
+    tag_count = edges // EDGES_PER_TAG + 1
+    conn.executemany("INSERT INTO tags (id, name) VALUES (?, ?)", ((i, f"tag{i}") for i in range(1, tag_count + 1)))
+
+    def _edges():
+        emitted = 0
+        while emitted < edges:
+            child_id = rng.randint(2, tag_count)
+            parent_id = rng.randint(1, child_id - 1)
+            yield parent_id, child_id
+            emitted += 1
+
+    conn.executemany(
+        "INSERT INTO tag_relationships (parent_tag_id, child_tag_id, path_length) VALUES (?, ?, 1)",
+        _edges()
+    )
+    conn.commit()
+    return tag_count
+
+
+def time_lookups(conn: sqlite3.Connection, lookup: Callable, tag_ids: List[int]) -> float:
+    """Mean latency of lookup over tag_ids, in microseconds."""
+    started = time.perf_counter()
+    for tag_id in tag_ids:
+        lookup(conn, tag_id)
+    return (time.perf_counter() - started) / len(tag_ids) * 1e6
+
+
+def main():
+    args = parse_args()
+    lookups = [db.get_direct_ancestors_ids, db.get_direct_descendants_ids]
+
+    print(f"{'edges':>10}  {'lookup':<28}  {'before (us)':>12}  {'after (us)':>12}")
+    for edges in args.edges:
+        rng = random.Random(args.seed)
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            conn = sqlite3.connect(Path(tmp_dir) / "bench.db")
+            conn.row_factory = sqlite3.Row
+            tag_count = build_graph(conn, edges, rng)
+            tag_ids = [rng.randint(1, tag_count) for _ in range(args.lookups)]
+
+            before = [time_lookups(conn, lookup, tag_ids) for lookup in lookups]
+            migrations.add_relationship_indexes(conn)
+            conn.commit()
+            after = [time_lookups(conn, lookup, tag_ids) for lookup in lookups]
+            conn.close()
+
+        for lookup, before_us, after_us in zip(lookups, before, after):
+            print(f"{edges:>10}  {lookup.__name__:<28}  {before_us:>12.1f}  {after_us:>12.1f}")
+
+
+if __name__ == "__main__":
+    main()
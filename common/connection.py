@@ -0,0 +1,93 @@
+"""
+Shared SQLite connection manager for the tags and timelog packages.
+
+Connections are opened once per (database path, thread) and reused, instead of
+being opened and closed on every call. Each one is configured on open with WAL
+journaling, synchronous=NORMAL, a larger page cache, memory-mapped I/O and a
+larger prepared-statement cache.
+"""
+from pathlib import Path
+import sqlite3
+import threading
+from typing import Callable, Dict, List
+
+from common import instrument
+
+PRAGMAS = (
+    "PRAGMA journal_mode = WAL",
+    "PRAGMA synchronous = NORMAL",
+    "PRAGMA cache_size = -65536",  # in KiB, i.e. 64 MiB
+    "PRAGMA mmap_size = 268435456",  # 256 MiB
+    "PRAGMA temp_store = MEMORY",
+)
+STATEMENT_CACHE_SIZE = 256
+
+_local = threading.local()
+
+# Called with each pooled connection just before it is closed, so per-connection
+# state kept elsewhere (keyed by id(conn)) can be dropped with it.
+_close_callbacks: List[Callable[[sqlite3.Connection], None]] = []
+
+
+def on_close(callback: Callable[[sqlite3.Connection], None]):
+    """Register callback to run on every connection close_connection or close_all closes."""
+    _close_callbacks.append(callback)
+
+
+def _close(conn: sqlite3.Connection):
+    for callback in _close_callbacks:
+        callback(conn)
+    conn.close()
+
+
+def _connections() -> Dict[str, sqlite3.Connection]:
+    if not hasattr(_local, "connections"):
+        _local.connections = {}
+    return _local.connections
+
+
+def _key(db_path: Path) -> str:
+    if str(db_path) == ":memory:":
+        return ":memory:"
+    return str(Path(db_path).resolve())
+
+
+def open_connection(db_path: Path) -> sqlite3.Connection:
+    """Open and configure a new connection that is not managed by the pool."""
+    conn = sqlite3.connect(
+        db_path, cached_statements=STATEMENT_CACHE_SIZE, factory=instrument.connection_factory()
+    )
+    conn.row_factory = sqlite3.Row
+    for pragma in PRAGMAS:
+        conn.execute(pragma)
+    return conn
+
+
+def get_connection(db_path: Path) -> sqlite3.Connection:
+    """
+    Return the connection of the current thread to db_path, opening it on first use.
+    
+    The connection stays open for reuse: callers must commit or roll back, but not close it.
+    """
+    connections = _connections()
+    key = _key(db_path)
+    conn = connections.get(key)
+    if conn is None:
+        conn = open_connection(db_path)
+        connections[key] = conn
+    return conn
+
+
+def close_connection(db_path: Path):
+    """Close the current thread's connection to db_path, if it is open."""
+    conn = _connections().pop(_key(db_path), None)
+    if conn is not None:
+        _close(conn)
+
+
+def close_all():
+    """Close every connection opened by the current thread."""
+    connections = _connections()
+    while connections:
+        _, conn = connections.popitem()
+        _close(conn)
@@ -0,0 +1,245 @@
+"""
+Opt-in SQL instrumentation for the tags and timelog packages.
+
+While profiling is on, connections opened by common.connection are
+InstrumentedConnection objects (a sqlite3.Connection subclass, so pandas and
+every existing caller accept them). Each statement is counted and timed,
+execution and fetching together, under its call site: the innermost function
+of the tags, timelog or common packages that issued it. Statements run one at
+a time more than N_PLUS_ONE_THRESHOLD times from the same call site are
+reported as likely N+1 patterns.
+
+Only connections opened after enable() are instrumented, so CLIs turn it on
+before touching the database:
+
+    with instrument.profiling(args.profile):
+        ...
+"""
+from contextlib import contextmanager
+from dataclasses import asdict, dataclass
+import json
+import re
+import sqlite3
+import sys
+import threading
+import time
+from typing import Dict, List, Optional, Tuple, Type
+
+PACKAGES = ("tags", "timelog", "common")
+N_PLUS_ONE_THRESHOLD = 50
+
+
+@dataclass
+class StatementStats:
+    site: str
+    sql: str
+    calls: int = 0
+    executemany_calls: int = 0
+    rows: int = 0
+    seconds: float = 0.0
+
+
+class Profiler:
+    def __init__(self):
+        self.stats: Dict[Tuple[str, str], StatementStats] = {}
+        self.lock = threading.Lock()
+
+    def stats_for(self, sql: str) -> StatementStats:
+        key = (_call_site(), _normalize(sql))
+        with self.lock:
+            stats = self.stats.get(key)
+            if stats is None:
+                stats = self.stats[key] = StatementStats(*key)
+        return stats
+
+    def record(self, stats: StatementStats, seconds: float, calls: int = 0, executemany_calls: int = 0, rows: int = 0):
+        with self.lock:
+            stats.calls += calls
+            stats.executemany_calls += executemany_calls
+            stats.rows += rows
+            stats.seconds += seconds
+
+    def by_site(self) -> List[Dict]:
+        """Totals per call site, slowest first."""
+        sites: Dict[str, Dict] = {}
+        for stats in self.stats.values():
+            site = sites.setdefault(stats.site, {"site": stats.site, "statements": 0, "seconds": 0.0})
+            site["statements"] += stats.calls + stats.executemany_calls
+            site["seconds"] += stats.seconds
+        return sorted(sites.values(), key=lambda site: site["seconds"], reverse=True)
+
+    def n_plus_one(self) -> List[StatementStats]:
+        """Statements executed one by one, from one call site, often enough to be worth batching."""
+        return sorted(
+            (stats for stats in self.stats.values() if stats.calls > N_PLUS_ONE_THRESHOLD),
+            key=lambda stats: stats.calls,
+            reverse=True
+        )
+
+    def report(self) -> Dict:
+        statements = sorted(self.stats.values(), key=lambda stats: stats.seconds, reverse=True)
+        return {
+            "total_statements": sum(stats.calls + stats.executemany_calls for stats in statements),
+            "total_seconds": sum(stats.seconds for stats in statements),
+            "sites": self.by_site(),
+            "statements": [asdict(stats) for stats in statements],
+            "n_plus_one": [asdict(stats) for stats in self.n_plus_one()],
+        }
+
+    def print_summary(self, out=None, limit: int = 15):
+        out = out if out is not None else sys.stderr
+        report = self.report()
+        print(f"\nSQL profile: {report['total_statements']} statements, {report['total_seconds']:.3f}s", file=out)
+        print(f"  {'call site':<48} {'statements':>10} {'seconds':>9}", file=out)
+        for site in report["sites"][:limit]:
+            print(f"  {site['site']:<48} {site['statements']:>10} {site['seconds']:>9.3f}", file=out)
+        for stats in self.n_plus_one():
+            print(f"  possible N+1: {stats.site} ran {stats.calls}x: {_shorten(stats.sql)}", file=out)
+
+
+class InstrumentedCursor(sqlite3.Cursor):
+    _stats: Optional[StatementStats] = None
+
+    def execute(self, sql, parameters=()):
+        profiler = self.connection.profiler
+        self._stats = profiler.stats_for(sql)
+        started = time.perf_counter()
+        try:
+            return super().execute(sql, parameters)
+        finally:
+            profiler.record(self._stats, time.perf_counter() - started, calls=1)
+
+    def executemany(self, sql, seq_of_parameters):
+        profiler = self.connection.profiler
+        self._stats = profiler.stats_for(sql)
+        started = time.perf_counter()
+        try:
+            return super().executemany(sql, seq_of_parameters)
+        finally:
+            profiler.record(self._stats, time.perf_counter() - started, executemany_calls=1)
+
+    def _fetch(self, fetch, *args):
+        started = time.perf_counter()
+        result = fetch(*args)
+        if self._stats is not None:
+            rows = len(result) if isinstance(result, list) else int(result is not None)
+            self.connection.profiler.record(self._stats, time.perf_counter() - started, rows=rows)
+        return result
+
+    def fetchone(self):
+        return self._fetch(super().fetchone)
+
+    def fetchmany(self, *args):
+        return self._fetch(super().fetchmany, *args)
+
+    def fetchall(self):
+        return self._fetch(super().fetchall)
+
+    def __next__(self):
+        started = time.perf_counter()
+        row = super().__next__()
+        if self._stats is not None:
+            self.connection.profiler.record(self._stats, time.perf_counter() - started, rows=1)
+        return row
+
+
+class InstrumentedConnection(sqlite3.Connection):
+    """Records into the profiler that was active when it was opened."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.profiler = _profiler or Profiler()
+
+    def cursor(self, factory=InstrumentedCursor):
+        return super().cursor(factory)
+
+    # The built-in shortcuts run statements on their cursor from C, bypassing
+    # InstrumentedCursor.execute, so they are redefined in terms of it.
+
+    def execute(self, sql, parameters=()):
+        return self.cursor().execute(sql, parameters)
+
+    def executemany(self, sql, seq_of_parameters):
+        return self.cursor().executemany(sql, seq_of_parameters)
+
+
+# -- Switch --
+
+_profiler: Optional[Profiler] = None
+
+
+def enable() -> Profiler:
+    """Instrument every connection opened from now on. Returns the active profiler."""
+    global _profiler
+    if _profiler is None:
+        _profiler = Profiler()
+    return _profiler
+
+
+def disable():
+    global _profiler
+    _profiler = None
+
+
+def connection_factory() -> Type[sqlite3.Connection]:
+    """The class common.connection should open connections with."""
+    return InstrumentedConnection if _profiler is not None else sqlite3.Connection
+
+
+@contextmanager
+def profiling(output: Optional[str]):
+    """
+    Profile the SQL run inside the block when output is set: "-" prints a
+    summary to stderr at the end, anything else is a path to dump JSON to.
+    With output None this does nothing.
+    """
+    if output is None:
+        yield None
+        return
+    from common import connection
+    # Pooled connections opened before profiling started would go unrecorded.
+    connection.close_all()
+    profiler = enable()
+    try:
+        yield profiler
+    finally:
+        connection.close_all()
+        disable()
+        if output == "-":
+            profiler.print_summary()
+        else:
+            with open(output, 'w', encoding='utf-8') as f:
+                json.dump(profiler.report(), f, indent=2)
+
+
+def add_profile_argument(p):
+    p.add_argument(
+        "--profile", dest="profile",
+        nargs="?", const="-", default=None,
+        help="Count and time SQL statements per call site; print a summary, or dump JSON to the given file",
+    )
+
+
+# -- Helpers --
+
+_IN_LIST = re.compile(r"\bIN\s*\(\s*\?(?:\s*,\s*\?)*\s*\)", re.IGNORECASE)
+_WHITESPACE = re.compile(r"\s+")
+
+
+def _normalize(sql: str) -> str:
+    """Collapse whitespace and IN lists of any length, so chunked queries group together."""
+    return _IN_LIST.sub("IN (?, ...)", _WHITESPACE.sub(" ", sql).strip())
+
+
+def _shorten(sql: str, width: int = 80) -> str:
+    return sql if len(sql) <= width else sql[:width - 3] + "..."
+
+
+def _call_site() -> str:
+    frame = sys._getframe(2)
+    while frame is not None:
+        module = frame.f_globals.get("__name__", "")
+        if module.split(".")[0] in PACKAGES and module != __name__:
+            return f"{module}.{frame.f_code.co_name}"
+        frame = frame.f_back
+    return "<other>"
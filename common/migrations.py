@@ -0,0 +1,44 @@
+"""
+Versioned schema migrations shared by the tags and timelog packages.
+
+Each component keeps its own version number in the schema_migrations table, so
+several packages can share one database file. A migration is a function taking
+the connection; migration N (1-based) brings a component from version N - 1 to N.
+"""
+import sqlite3
+from typing import Callable, List
+
+Migration = Callable[[sqlite3.Connection], None]
+
+
+def get_version(conn: sqlite3.Connection, component: str) -> int:
+    conn.execute(
+        "CREATE TABLE IF NOT EXISTS schema_migrations ("
+        "component TEXT PRIMARY KEY, version INTEGER NOT NULL)"
+    )
+    row = conn.execute("SELECT version FROM schema_migrations WHERE component = ?", (component,)).fetchone()
+    return row[0] if row is not None else 0
+
+
+def apply_migrations(conn: sqlite3.Connection, component: str, migrations: List[Migration]) -> int:
+    """
+    Apply the migrations of a component that have not been applied yet.
+    
+    Args:
+        conn: Database connection to use
+        component: Name the version is recorded under
+        migrations: Ordered list of migrations of the component
+    
+    Returns:
+        The version the component is at after migrating
+    """
+    version = get_version(conn, component)
+    for migration in migrations[version:]:
+        migration(conn)
+        version += 1
+        conn.execute(
+            "INSERT INTO schema_migrations (component, version) VALUES (?, ?) "
+            "ON CONFLICT (component) DO UPDATE SET version = excluded.version",
+            (component, version)
+        )
+    return version
@@ -0,0 +1,143 @@
+"""
+Bulk, set-based variant of sync.import_from_csv for large CSV files.
+
+The whole incoming graph is validated in memory before anything is written,
+and an invalid batch is rejected as a whole. A valid batch is diffed against the
+database and applied with a handful of executemany batches in one transaction.
+"""
+from collections import Counter
+from pathlib import Path
+from typing import AbstractSet, Dict, List
+
+from tags import db, graph
+from tags.sync import CsvTag, SyncResult, combined_graph, is_unchanged, read_csv_tags
+from tags.utils import toposort, tree
+
+
+def validate_batch(
+    tag_graph: graph.TagGraph,
+    csv_tags: List[CsvTag],
+    delete_missing: bool,
+    in_use_ids: AbstractSet[int] = frozenset()
+) -> List[str]:
+    """
+    Validate the tag hierarchy that importing csv_tags would produce.
+    
+    Checks that every referenced ID and ancestor exists, that names stay unique,
+    and that the combined database + CSV graph has no self-references or cycles.
+    Returns list of error messages (empty if valid).
+    
+    Args:
+        tag_graph: Graph of the tags currently in the database
+        csv_tags: Rows read from the CSV file
+        delete_missing: Whether database tags missing from the CSV will be deleted
+        in_use_ids: Database tags that stay even if delete_missing, because
+            time-log entries use them
+    """
+    errors = []
+
+    id_counts = Counter(csv_tag.id for csv_tag in csv_tags if csv_tag.id is not None)
+    for tag_id, count in id_counts.items():
+        if tag_id not in tag_graph:
+            errors.append(f"Tag with ID {tag_id} not found")
+        if count > 1:
+            errors.append(f"Tag with ID {tag_id} appears {count} times in the CSV")
+
+    # Nodes of the resulting graph: the CSV rows first, then the database tags
+    # the CSV leaves untouched.
+    kept_ids = [
+        tag_id for tag_id in tag_graph.names
+        if tag_id not in id_counts and (not delete_missing or tag_id in in_use_ids)
+    ]
+    names = [csv_tag.name for csv_tag in csv_tags] + [tag_graph.name(tag_id) for tag_id in kept_ids]
+    for name, count in Counter(names).items():
+        if count > 1:
+            errors.append(f"Tag name '{name}' is used by {count} tags")
+
+    parents, row_errors = combined_graph(tag_graph, csv_tags, kept_ids)
+    for index in sorted(row_errors):
+        errors.extend(row_errors[index])
+
+    order, cyclic = toposort.topological_sort(parents)
+    for node in sorted(cyclic):
+        errors.append(f"Cycle detected: Tag '{names[node]}' is its own ancestor")
+    ordered = set(order)
+    for node in range(len(csv_tags)):
+        if node not in ordered and node not in cyclic:
+            errors.append(f"Tag '{names[node]}' is below a cycle")
+
+    return errors
+
+
+def import_from_csv(
+    db_path: Path,
+    csv_path: Path,
+    delete_missing: bool = False,
+    dry_run: bool = False
+) -> SyncResult:
+    """
+    Import tags from CSV file with two-way sync, validating and writing the whole file as one batch.
+    
+    Args:
+        db_path: Path to the database
+        csv_path: Path to the CSV file
+        delete_missing: If True, delete tags from DB that are not in CSV, except
+            those time-log entries use
+        dry_run: If True, don't actually modify the database, just report what would happen
+    
+    Returns:
+        SyncResult with statistics about the sync operation. If any row is invalid,
+        only errors are reported and the database is left untouched.
+    """
+    result = SyncResult()
+    csv_tags = read_csv_tags(csv_path)
+
+    with db.transaction(db_path, dry_run=dry_run) as conn:
+        tag_graph = graph.get_graph(conn)
+        csv_ids = {csv_tag.id for csv_tag in csv_tags if csv_tag.id is not None}
+        missing_ids = [tag_id for tag_id in tag_graph.names if tag_id not in csv_ids] if delete_missing else []
+        in_use_ids = db.get_ids_used_by_time_logs(conn, missing_ids)
+        errors = validate_batch(tag_graph, csv_tags, delete_missing, in_use_ids)
+        if errors:
+            result.errors.extend(errors)
+            return result
+
+        existing_tags = {tag.id: tag for tag in tag_graph.tags()}
+        deleted_ids = [tag_id for tag_id in missing_ids if tag_id not in in_use_ids]
+        result.kept_in_use = len(in_use_ids)
+        renames = {
+            csv_tag.id: csv_tag.name
+            for csv_tag in csv_tags
+            if csv_tag.id is not None and csv_tag.name != tag_graph.name(csv_tag.id)
+        }
+        new_names = [csv_tag.name for csv_tag in csv_tags if csv_tag.id is None]
+
+        name_to_id = {name: tag_id for tag_id, name in tag_graph.names.items()}
+        name_to_id.update((csv_tag.name, csv_tag.id) for csv_tag in csv_tags if csv_tag.id is not None)
+
+        db.delete_tags(conn, deleted_ids)
+        db.rename_tags(conn, renames)
+        name_to_id.update(db.insert_tags(conn, new_names))
+
+        ancestors: Dict[int, List[int]] = {}
+        for csv_tag in csv_tags:
+            tag_id = name_to_id[csv_tag.name]
+            ancestor_ids = [name_to_id[ancestor_name] for ancestor_name in csv_tag.ancestor_names]
+            if csv_tag.id is None:
+                ancestors[tag_id] = ancestor_ids
+                continue
+            if is_unchanged(existing_tags[tag_id], csv_tag.name, ancestor_ids):
+                result.unchanged += 1
+                continue
+            result.updated += 1
+            if set(ancestor_ids) != set(existing_tags[tag_id].direct_ancestors):
+                ancestors[tag_id] = ancestor_ids
+        db.set_direct_ancestors(conn, ancestors)
+
+        result.added = len(new_names)
+        result.deleted = len(deleted_ids)
+
+        if dry_run:
+            tree.show_tree(conn, 1)
+
+    return result
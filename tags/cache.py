@@ -0,0 +1,117 @@
+"""
+Optional LRU cache of tags by id and by name.
+
+Caching is off until enable_cache is called for a connection. Once on,
+get_tags_by_ids and get_tags_by_names in tags.db answer from it and only
+query the keys they miss. The tags.db writers invalidate what they touch, and
+SQLite's data_version pragma tells when another connection has committed, in
+which case the whole cache is dropped.
+
+Callers get copies of the cached tags, so they may modify what they are given.
+"""
+from collections import OrderedDict
+import dataclasses
+import sqlite3
+from typing import Dict, Iterable, Optional, Tuple
+
+from common import connection
+from tags.tag import Tag
+
+
+class TagCache:
+    def __init__(self, maxsize: int):
+        self.maxsize = maxsize
+        self.by_id: "OrderedDict[int, Tag]" = OrderedDict()
+        self.id_by_name: Dict[str, int] = {}
+        self.data_version: Optional[int] = None
+        # Set by writes of this connection; rows read before their transaction
+        # ends may still be rolled back, so they are not cached.
+        self.dirty = False
+
+    def sync(self, conn: sqlite3.Connection):
+        """Drop everything if another connection has committed since the last call."""
+        data_version = conn.execute("PRAGMA data_version").fetchone()[0]
+        if data_version != self.data_version:
+            self.clear()
+            self.data_version = data_version
+        if not conn.in_transaction:
+            self.dirty = False
+
+    def can_store(self, conn: sqlite3.Connection) -> bool:
+        return not (self.dirty and conn.in_transaction)
+
+    def get_by_id(self, tag_id: int) -> Optional[Tag]:
+        tag = self.by_id.get(tag_id)
+        if tag is None:
+            return None
+        self.by_id.move_to_end(tag_id)
+        return _copy(tag)
+
+    def get_by_name(self, name: str) -> Optional[Tag]:
+        tag_id = self.id_by_name.get(name)
+        return None if tag_id is None else self.get_by_id(tag_id)
+
+    def put(self, tag: Tag):
+        self.invalidate([tag.id])
+        self.by_id[tag.id] = _copy(tag)
+        self.id_by_name[tag.name] = tag.id
+        while len(self.by_id) > self.maxsize:
+            _, evicted = self.by_id.popitem(last=False)
+            del self.id_by_name[evicted.name]
+
+    def invalidate(self, tag_ids: Iterable[int]):
+        for tag_id in tag_ids:
+            tag = self.by_id.pop(tag_id, None)
+            if tag is not None:
+                del self.id_by_name[tag.name]
+
+    def clear(self):
+        self.by_id.clear()
+        self.id_by_name.clear()
+
+
+def _copy(tag: Tag) -> Tag:
+    return dataclasses.replace(tag, direct_ancestors=list(tag.direct_ancestors))
+
+
+# -- Per-connection cache --
+#
+# Keyed by id(conn) like the graphs in tags.graph, for the same reason. Holding
+# the connection would keep it alive forever, so the entry is dropped when
+# common.connection closes it; other connections must call disable_cache.
+
+_caches: Dict[int, Tuple[sqlite3.Connection, TagCache]] = {}
+
+
+def enable_cache(conn: sqlite3.Connection, maxsize: int = 10_000) -> TagCache:
+    """Start caching the tags read through this connection (no-op if already on)."""
+    cache = cached_tags(conn)
+    if cache is None:
+        cache = TagCache(maxsize)
+        _caches[id(conn)] = (conn, cache)
+    return cache
+
+
+def cached_tags(conn: sqlite3.Connection) -> Optional[TagCache]:
+    """Return the cache of this connection, or None if caching is off."""
+    entry = _caches.get(id(conn))
+    if entry is None or entry[0] is not conn:
+        return None
+    return entry[1]
+
+
+def invalidate(conn: sqlite3.Connection, tag_ids: Iterable[int]):
+    """Forget the given tags after a write through this connection."""
+    cache = cached_tags(conn)
+    if cache is not None:
+        cache.dirty = True
+        cache.invalidate(tag_ids)
+
+
+def disable_cache(conn: sqlite3.Connection):
+    entry = _caches.get(id(conn))
+    if entry is not None and entry[0] is conn:
+        del _caches[id(conn)]
+
+
+connection.on_close(disable_cache)
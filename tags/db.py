@@ -1,8 +1,12 @@
+from collections import defaultdict, deque
 from pathlib import Path
 import sqlite3
-from typing import List
+from typing import Dict, Iterable, Iterator, List, Optional, Set, Tuple
 from contextlib import contextmanager
 
+from common import connection
+from common.migrations import apply_migrations
+from tags import cache, graph, migrations
 from tags.tag import Tag
 from tags.validation import validate_tag
 
@@ -14,9 +18,10 @@ def transaction(db_path: Path, dry_run: bool = False):
     
     If dry_run is True, all changes are rolled back at the end.
     Otherwise, changes are committed.
+    The connection comes from the shared pool and stays open for the next transaction;
+    the in-memory tag graph of the connection lives as long as the transaction.
     """
-    conn = sqlite3.connect(db_path)
-    conn.row_factory = sqlite3.Row
+    conn = connection.get_connection(db_path)
     try:
         yield conn
         if not dry_run:
@@ -27,15 +32,22 @@ def transaction(db_path: Path, dry_run: bool = False):
         conn.rollback()
         raise
     finally:
-        conn.close()
+        graph.discard_graph(conn)
 
 
 # -- Schema --
 
 def init_db(conn: sqlite3.Connection):
+    """
+    Create the tags schema if needed and bring it up to the latest migration.
+    
+    Args:
+        conn: Database connection to use
+    """
     schema_path = Path(__file__).parent / "schema.sql"
     schema_sql = open(schema_path).read()
     conn.executescript(schema_sql)
+    apply_migrations(conn, "tags", migrations.TAGS_MIGRATIONS)
 
 
 # -- Adding --
@@ -57,8 +69,14 @@ def add_tag(conn: sqlite3.Connection, tag: Tag):
     
     cursor = conn.execute("INSERT INTO tags (name) VALUES (?)", (tag.name,))
     tag_id = cursor.lastrowid
-    for ancestor_id in tag.direct_ancestors:
-        conn.execute("INSERT INTO tag_relationships (parent_tag_id, child_tag_id, path_length) VALUES (?, ?, ?)", (ancestor_id, tag_id, 1))
+    _insert_direct_ancestors(conn, tag_id, tag.direct_ancestors)
+    _refresh_closure(conn, {tag_id})
+    cache.invalidate(conn, [tag_id])
+    _record_changes(conn, [tag_id])
+
+    tag_graph = graph.cached_graph(conn)
+    if tag_graph is not None:
+        tag_graph.add(tag_id, tag.name, tag.direct_ancestors)
     return tag_id
 
 def update_tag(conn: sqlite3.Connection, tag: Tag):
@@ -77,58 +95,537 @@ def update_tag(conn: sqlite3.Connection, tag: Tag):
         return errors
     
     conn.execute("UPDATE tags SET name = ? WHERE id = ?", (tag.name, tag.id))
-    conn.execute("DELETE FROM tag_relationships WHERE child_tag_id = ?", (tag.id,))
-    for ancestor_id in tag.direct_ancestors:
-        conn.execute(
-            "INSERT INTO tag_relationships (parent_tag_id, child_tag_id, path_length) VALUES (?, ?, ?)",
-            (ancestor_id, tag.id, 1)
-        )
+    # A rename leaves the hierarchy alone; only re-parenting touches the closure.
+    if set(tag.direct_ancestors) != set(get_direct_ancestors_ids(conn, tag.id)):
+        conn.execute("DELETE FROM tag_relationships WHERE child_tag_id = ?", (tag.id,))
+        _insert_direct_ancestors(conn, tag.id, tag.direct_ancestors)
+        _refresh_closure(conn, {tag.id} | set(get_all_descendants_ids(conn, tag.id)))
+    cache.invalidate(conn, [tag.id])
+    _record_changes(conn, [tag.id])
+
+    tag_graph = graph.cached_graph(conn)
+    if tag_graph is not None:
+        tag_graph.update(tag.id, tag.name, tag.direct_ancestors)
 
 def delete_tag(conn: sqlite3.Connection, tag_id: int):
     """
     Delete a tag from the database.
     
+    Descendants of the deleted tag keep their other ancestors; any ancestor
+    that was only reachable through the deleted tag is dropped from their closure.
+    
     Args:
         conn: Database connection to use
         tag_id: ID of the tag to delete
+    
+    Raises:
+        sqlite3.IntegrityError: If time-log entries use the tag
     """
+    _check_unused(conn, [tag_id])
+    descendants_ids = set(get_all_descendants_ids(conn, tag_id))
+    children_ids = get_direct_descendants_ids(conn, tag_id)
     conn.execute("DELETE FROM tags WHERE id = ?", (tag_id,))
     conn.execute("DELETE FROM tag_relationships WHERE parent_tag_id = ? OR child_tag_id = ?", (tag_id, tag_id))
+    _refresh_closure(conn, descendants_ids)
+    cache.invalidate(conn, {tag_id} | descendants_ids)
+    _record_changes(conn, [tag_id], deleted=True)
+    _record_changes(conn, children_ids)
+
+    tag_graph = graph.cached_graph(conn)
+    if tag_graph is not None:
+        tag_graph.remove(tag_id)
+
+
+# -- Bulk --
+#
+# Set-based writes for large batches. Unlike add_tag/update_tag these do not
+# validate anything: callers validate the whole batch up front.
+
+def delete_tags(conn: sqlite3.Connection, tag_ids: Iterable[int]):
+    """
+    Delete several tags at once.
+    
+    Args:
+        conn: Database connection to use
+        tag_ids: IDs of the tags to delete
+    
+    Raises:
+        sqlite3.IntegrityError: If time-log entries use any of the tags
+    """
+    tag_ids = set(tag_ids)
+    if not tag_ids:
+        return
+    _check_unused(conn, tag_ids)
+    affected_ids = _descendants_of(conn, tag_ids) - tag_ids
+    children_ids = _children_of(conn, tag_ids) - tag_ids
+    conn.executemany("DELETE FROM tags WHERE id = ?", ((tag_id,) for tag_id in tag_ids))
+    conn.executemany(
+        "DELETE FROM tag_relationships WHERE parent_tag_id = ? OR child_tag_id = ?",
+        ((tag_id, tag_id) for tag_id in tag_ids)
+    )
+    _refresh_closure(conn, affected_ids)
+    cache.invalidate(conn, tag_ids | affected_ids)
+    _record_changes(conn, tag_ids, deleted=True)
+    _record_changes(conn, children_ids)
+
+    tag_graph = graph.cached_graph(conn)
+    if tag_graph is not None:
+        for tag_id in tag_ids:
+            tag_graph.remove(tag_id)
+
+def rename_tags(conn: sqlite3.Connection, names: Dict[int, str]):
+    """
+    Rename several tags at once. Names may be swapped or shifted between the
+    renamed tags, as long as the final names are unique.
+    
+    Args:
+        conn: Database connection to use
+        names: New name of each renamed tag, keyed by tag ID
+    """
+    # Move every renamed tag out of the way first so the UNIQUE constraint on
+    # name only has to hold for the final names.
+    conn.executemany("UPDATE tags SET name = ? WHERE id = ?", ((f"\0{tag_id}", tag_id) for tag_id in names))
+    conn.executemany("UPDATE tags SET name = ? WHERE id = ?", ((name, tag_id) for tag_id, name in names.items()))
+    cache.invalidate(conn, names)
+    _record_changes(conn, names)
+
+    tag_graph = graph.cached_graph(conn)
+    if tag_graph is not None:
+        tag_graph.names.update(names)
+
+def insert_tags(conn: sqlite3.Connection, names: List[str]) -> Dict[str, int]:
+    """
+    Insert several tags at once, without ancestors.
+    
+    Args:
+        conn: Database connection to use
+        names: Names of the new tags
+    
+    Returns:
+        The ID of each new tag, keyed by name
+    """
+    conn.executemany("INSERT INTO tags (name) VALUES (?)", ((name,) for name in names))
+    name_to_id: Dict[str, int] = {}
+    for chunk in _chunked(conn, names):
+        placeholders = ",".join("?" * len(chunk))
+        for row in conn.execute(f"SELECT id, name FROM tags WHERE name IN ({placeholders})", chunk):
+            name_to_id[row['name']] = row['id']
+    cache.invalidate(conn, name_to_id.values())
+    _record_changes(conn, name_to_id.values())
+
+    tag_graph = graph.cached_graph(conn)
+    if tag_graph is not None:
+        for name, tag_id in name_to_id.items():
+            tag_graph.add(tag_id, name, [])
+    return name_to_id
+
+def insert_tags_with_ids(conn: sqlite3.Connection, names: Dict[int, str]):
+    """
+    Insert several tags at once under given IDs, without ancestors. Used to
+    replicate tags from another database, keeping their IDs.
+    
+    Args:
+        conn: Database connection to use
+        names: Name of each new tag, keyed by tag ID
+    """
+    conn.executemany("INSERT INTO tags (id, name) VALUES (?, ?)", names.items())
+    cache.invalidate(conn, names)
+    _record_changes(conn, names)
+
+    tag_graph = graph.cached_graph(conn)
+    if tag_graph is not None:
+        for tag_id, name in names.items():
+            tag_graph.add(tag_id, name, [])
+
+def set_direct_ancestors(conn: sqlite3.Connection, ancestors: Dict[int, List[int]]):
+    """
+    Replace the direct ancestors of several tags at once and refresh the closure
+    of everything below them.
+    
+    Args:
+        conn: Database connection to use
+        ancestors: New direct ancestor IDs of each changed tag, keyed by tag ID
+    """
+    if not ancestors:
+        return
+    affected_ids = set(ancestors) | _descendants_of(conn, ancestors)
+    conn.executemany("DELETE FROM tag_relationships WHERE child_tag_id = ?", ((tag_id,) for tag_id in ancestors))
+    conn.executemany(
+        "INSERT INTO tag_relationships (parent_tag_id, child_tag_id, path_length) VALUES (?, ?, 1)",
+        (
+            (ancestor_id, tag_id)
+            for tag_id, ancestor_ids in ancestors.items()
+            for ancestor_id in dict.fromkeys(ancestor_ids)
+        )
+    )
+    _refresh_closure(conn, affected_ids)
+    cache.invalidate(conn, ancestors)
+    _record_changes(conn, ancestors)
+
+    tag_graph = graph.cached_graph(conn)
+    if tag_graph is not None:
+        for tag_id, ancestor_ids in ancestors.items():
+            tag_graph.update(tag_id, tag_graph.name(tag_id), ancestor_ids)
+
+
+# -- Closure --
+#
+# tag_relationships holds the transitive closure of the hierarchy: one row per
+# (ancestor, descendant) pair, with path_length set to the length of the
+# shortest path between them. Rows with path_length = 1 are the direct edges and
+# are the source of truth; every other row is derived from them.
+
+# Bound-parameter limit assumed when the connection cannot report its own: the
+# default of SQLite before 3.32.
+DEFAULT_MAX_VARIABLES = 999
+
+def _max_variables(conn: sqlite3.Connection) -> int:
+    """Most bound parameters a statement may have on this connection (getlimit needs Python 3.11)."""
+    try:
+        return conn.getlimit(sqlite3.SQLITE_LIMIT_VARIABLE_NUMBER)
+    except AttributeError:
+        return DEFAULT_MAX_VARIABLES
+
+def _chunked(conn: sqlite3.Connection, ids: Iterable) -> Iterator[List]:
+    """Split ids into IN lists as long as the connection allows, so each costs one statement."""
+    ids = list(ids)
+    size = _max_variables(conn)
+    for start in range(0, len(ids), size):
+        yield ids[start:start + size]
+
+def get_ids_used_by_time_logs(conn: sqlite3.Connection, tag_ids: Iterable[int]) -> Set[int]:
+    """
+    Return the tags among tag_ids that time-log entries are linked to through
+    time_log_tags (none if the timelog tables were never created in this database).
+    """
+    has_time_logs = conn.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'time_log_tags'"
+    ).fetchone()
+    if has_time_logs is None:
+        return set()
+    used: Set[int] = set()
+    for chunk in _chunked(conn, tag_ids):
+        placeholders = ",".join("?" * len(chunk))
+        cursor = conn.execute(f"SELECT DISTINCT tag_id FROM time_log_tags WHERE tag_id IN ({placeholders})", chunk)
+        used.update(row['tag_id'] for row in cursor)
+    return used
+
+def _check_unused(conn: sqlite3.Connection, tag_ids: Iterable[int]):
+    # Deleting a tag would leave its time_log_tags and bucket rows pointing nowhere.
+    used = get_ids_used_by_time_logs(conn, tag_ids)
+    if used:
+        raise sqlite3.IntegrityError(f"Tags {sorted(used)} are used by time-log entries")
+
+def _descendants_of(conn: sqlite3.Connection, tag_ids: Iterable[int]) -> Set[int]:
+    descendants: Set[int] = set()
+    for chunk in _chunked(conn, tag_ids):
+        placeholders = ",".join("?" * len(chunk))
+        cursor = conn.execute(f"SELECT child_tag_id FROM tag_relationships WHERE parent_tag_id IN ({placeholders})", chunk)
+        descendants.update(row['child_tag_id'] for row in cursor)
+    return descendants
+
+def _children_of(conn: sqlite3.Connection, tag_ids: Iterable[int]) -> Set[int]:
+    children: Set[int] = set()
+    for chunk in _chunked(conn, tag_ids):
+        placeholders = ",".join("?" * len(chunk))
+        cursor = conn.execute(
+            f"SELECT child_tag_id FROM tag_relationships WHERE parent_tag_id IN ({placeholders}) AND path_length = 1",
+            chunk
+        )
+        children.update(row['child_tag_id'] for row in cursor)
+    return children
+
+def _insert_direct_ancestors(conn: sqlite3.Connection, tag_id: int, ancestor_ids: List[int]):
+    conn.executemany(
+        "INSERT INTO tag_relationships (parent_tag_id, child_tag_id, path_length) VALUES (?, ?, 1)",
+        [(ancestor_id, tag_id) for ancestor_id in dict.fromkeys(ancestor_ids)]
+    )
+
+def _refresh_closure(conn: sqlite3.Connection, affected_ids: Set[int]):
+    """
+    Recompute the indirect closure rows of every tag in affected_ids.
+    
+    affected_ids must be closed under descendants (every descendant of a member
+    is also a member), so that the closure of ancestors outside the set is
+    already correct and can be reused as-is.
+    """
+    if not affected_ids:
+        return
+
+    direct_parents: Dict[int, List[int]] = defaultdict(list)
+    for chunk in _chunked(conn, affected_ids):
+        placeholders = ",".join("?" * len(chunk))
+        for row in conn.execute(
+            f"SELECT parent_tag_id, child_tag_id FROM tag_relationships "
+            f"WHERE path_length = 1 AND child_tag_id IN ({placeholders})", chunk
+        ):
+            direct_parents[row['child_tag_id']].append(row['parent_tag_id'])
+
+    outside_parents = {
+        parent_id
+        for parents in direct_parents.values()
+        for parent_id in parents
+        if parent_id not in affected_ids
+    }
+    outside_closure: Dict[int, Dict[int, int]] = defaultdict(dict)
+    for chunk in _chunked(conn, outside_parents):
+        placeholders = ",".join("?" * len(chunk))
+        for row in conn.execute(
+            f"SELECT parent_tag_id, child_tag_id, path_length FROM tag_relationships "
+            f"WHERE child_tag_id IN ({placeholders})", chunk
+        ):
+            outside_closure[row['child_tag_id']][row['parent_tag_id']] = row['path_length']
+
+    # Kahn's algorithm over the edges inside the affected set, so that every
+    # tag is processed after all of its affected parents.
+    pending_parents = {tag_id: 0 for tag_id in affected_ids}
+    children: Dict[int, List[int]] = defaultdict(list)
+    for child_id, parents in direct_parents.items():
+        for parent_id in parents:
+            if parent_id in affected_ids:
+                pending_parents[child_id] += 1
+                children[parent_id].append(child_id)
+
+    closure: Dict[int, Dict[int, int]] = {}
+    queue = deque(tag_id for tag_id, count in pending_parents.items() if count == 0)
+    while queue:
+        tag_id = queue.popleft()
+        ancestors: Dict[int, int] = {}
+        for parent_id in direct_parents.get(tag_id, []):
+            parent_ancestors = closure[parent_id] if parent_id in affected_ids else outside_closure[parent_id]
+            for ancestor_id, depth in parent_ancestors.items():
+                if depth + 1 < ancestors.get(ancestor_id, depth + 2):
+                    ancestors[ancestor_id] = depth + 1
+        for parent_id in direct_parents.get(tag_id, []):
+            ancestors[parent_id] = 1
+        closure[tag_id] = ancestors
+
+        for child_id in children[tag_id]:
+            pending_parents[child_id] -= 1
+            if pending_parents[child_id] == 0:
+                queue.append(child_id)
+
+    if len(closure) != len(affected_ids):
+        stuck = sorted(affected_ids - closure.keys())
+        raise ValueError(f"Cycle in the tag hierarchy among tags {stuck}")
+
+    for chunk in _chunked(conn, affected_ids):
+        placeholders = ",".join("?" * len(chunk))
+        conn.execute(
+            f"DELETE FROM tag_relationships WHERE path_length > 1 AND child_tag_id IN ({placeholders})", chunk
+        )
+    conn.executemany(
+        "INSERT INTO tag_relationships (parent_tag_id, child_tag_id, path_length) VALUES (?, ?, ?)",
+        (
+            (ancestor_id, tag_id, depth)
+            for tag_id, ancestors in closure.items()
+            for ancestor_id, depth in ancestors.items()
+            if depth > 1
+        )
+    )
+
+def rebuild_closure(conn: sqlite3.Connection):
+    """
+    Recompute the whole closure from the direct relationships.
+    
+    Needed once for databases written before the closure was maintained,
+    which only contain path_length = 1 rows.
+    
+    Args:
+        conn: Database connection to use
+    """
+    tag_ids = {row['id'] for row in conn.execute("SELECT id FROM tags")}
+    _refresh_closure(conn, tag_ids)
+
+
+# -- Change log --
+#
+# tag_changes gets a row with a new, increasing seq whenever a tag is added,
+# renamed, re-parented or deleted (deleted = 1, a tombstone). A replica that has
+# applied every change up to some seq catches up with the changes after it.
+
+def _record_changes(conn: sqlite3.Connection, tag_ids: Iterable[int], deleted: bool = False):
+    conn.executemany(
+        "INSERT INTO tag_changes (tag_id, deleted) VALUES (?, ?)",
+        ((tag_id, int(deleted)) for tag_id in tag_ids)
+    )
+
+def get_change_seq(conn: sqlite3.Connection) -> int:
+    """Sequence number of the latest change, 0 if there is none."""
+    return conn.execute("SELECT MAX(seq) FROM tag_changes").fetchone()[0] or 0
+
+def iter_changes_since(
+    conn: sqlite3.Connection,
+    since: int
+) -> Iterator[Tuple[int, int, Optional[str], List[int], bool]]:
+    """
+    Stream the current state of every tag changed after seq since, in seq order.
+    
+    Only the latest change of each tag is returned, so the cost depends on the
+    number of changes, not on the number of tags.
+    
+    Args:
+        conn: Database connection to use
+        since: Sequence number already applied by the consumer
+    
+    Returns:
+        (seq, tag ID, name, direct ancestor IDs, deleted) tuples; deleted tags have no name or ancestors
+    """
+    cursor = conn.execute("""
+        SELECT c.seq, c.tag_id, c.deleted, t.name, group_concat(r.parent_tag_id, ' ') AS ancestor_ids
+        FROM (SELECT MAX(seq) AS seq FROM tag_changes WHERE seq > ? GROUP BY tag_id) latest
+        JOIN tag_changes c ON c.seq = latest.seq
+        LEFT JOIN tags t ON t.id = c.tag_id AND c.deleted = 0
+        LEFT JOIN tag_relationships r ON r.child_tag_id = t.id AND r.path_length = 1
+        GROUP BY c.seq
+        ORDER BY c.seq
+    """, (since,))
+    for row in cursor:
+        ancestor_ids = [int(ancestor_id) for ancestor_id in row['ancestor_ids'].split()] if row['ancestor_ids'] else []
+        yield row['seq'], row['tag_id'], row['name'], ancestor_ids, bool(row['deleted'])
 
 
 # -- Getting --
 
 def get_direct_ancestors_ids(conn: sqlite3.Connection, tag_id: int) -> List[int]:
-    cursor = conn.execute("SELECT * FROM tag_relationships WHERE child_tag_id = ? AND path_length = 1", (tag_id,))
+    cursor = conn.execute("SELECT parent_tag_id FROM tag_relationships WHERE child_tag_id = ? AND path_length = 1", (tag_id,))
     rows = cursor.fetchall()
     return [row['parent_tag_id'] for row in rows]
 
 def get_direct_descendants_ids(conn: sqlite3.Connection, tag_id: int) -> List[int]:
-    cursor = conn.execute("SELECT * FROM tag_relationships WHERE parent_tag_id = ? AND path_length = 1", (tag_id,))
+    cursor = conn.execute("SELECT child_tag_id FROM tag_relationships WHERE parent_tag_id = ? AND path_length = 1", (tag_id,))
     rows = cursor.fetchall()
     return [row['child_tag_id'] for row in rows]
 
+def get_all_ancestors_ids(conn: sqlite3.Connection, tag_id: int) -> List[int]:
+    cursor = conn.execute("SELECT parent_tag_id FROM tag_relationships WHERE child_tag_id = ?", (tag_id,))
+    return [row['parent_tag_id'] for row in cursor]
+
+def get_all_descendants_ids(conn: sqlite3.Connection, tag_id: int) -> List[int]:
+    cursor = conn.execute("SELECT child_tag_id FROM tag_relationships WHERE parent_tag_id = ?", (tag_id,))
+    return [row['child_tag_id'] for row in cursor]
+
 def get_tag_by_id(conn: sqlite3.Connection, id: int) -> Tag:
-    cursor = conn.execute("SELECT * FROM tags WHERE id = ?", (id,))
-    row = cursor.fetchone()
-    if row is None:
-        return None
-    return Tag(id=row['id'], name=row['name'], direct_ancestors=get_direct_ancestors_ids(conn, row['id']))
+    return get_tags_by_ids(conn, [id]).get(id)
 
 def tag_exists(conn: sqlite3.Connection, id: int) -> bool:
-    cursor = conn.execute("SELECT * FROM tags WHERE id = ?", (id,))
+    cursor = conn.execute("SELECT 1 FROM tags WHERE id = ?", (id,))
     row = cursor.fetchone()
     return row is not None
 
 def get_tag_by_name(conn: sqlite3.Connection, name: str) -> Tag:
-    cursor = conn.execute("SELECT * FROM tags WHERE name = ?", (name,))
-    row = cursor.fetchone()
-    if row is None:
-        return None
-    direct_ancestors = get_direct_ancestors_ids(conn, row['id'])
-    return Tag(id=row['id'], name=row['name'], direct_ancestors=direct_ancestors)
+    return get_tags_by_names(conn, [name]).get(name)
+
+def get_tags_by_ids(conn: sqlite3.Connection, ids: Iterable[int]) -> Dict[int, Tag]:
+    """
+    Look up many tags by ID, two queries per batch of as many IDs as SQLite allows in one statement (fewer with the cache on).
+    
+    Args:
+        conn: Database connection to use
+        ids: IDs to look up
+    
+    Returns:
+        The tags found, keyed by ID; unknown IDs are left out
+    """
+    return {tag.id: tag for tag in _get_tags(conn, "id", ids)}
+
+def get_tags_by_names(conn: sqlite3.Connection, names: Iterable[str]) -> Dict[str, Tag]:
+    """
+    Look up many tags by name, two queries per batch of as many names as SQLite allows in one statement (fewer with the cache on).
+    
+    Args:
+        conn: Database connection to use
+        names: Names to look up
+    
+    Returns:
+        The tags found, keyed by name; unknown names are left out
+    """
+    return {tag.name: tag for tag in _get_tags(conn, "name", names)}
+
+def _get_tags(conn: sqlite3.Connection, column: str, keys: Iterable) -> List[Tag]:
+    keys = list(dict.fromkeys(keys))
+    tag_cache = cache.cached_tags(conn)
+    found: List[Tag] = []
+    if tag_cache is not None:
+        tag_cache.sync(conn)
+        lookup = tag_cache.get_by_id if column == "id" else tag_cache.get_by_name
+        missing = []
+        for key in keys:
+            tag = lookup(key)
+            if tag is None:
+                missing.append(key)
+            else:
+                found.append(tag)
+        keys = missing
+
+    rows = []
+    for chunk in _chunked(conn, keys):
+        placeholders = ",".join("?" * len(chunk))
+        rows.extend(conn.execute(f"SELECT id, name FROM tags WHERE {column} IN ({placeholders})", chunk))
+    parents: Dict[int, List[int]] = defaultdict(list)
+    for chunk in _chunked(conn, [row['id'] for row in rows]):
+        placeholders = ",".join("?" * len(chunk))
+        cursor = conn.execute(
+            f"SELECT parent_tag_id, child_tag_id FROM tag_relationships WHERE child_tag_id IN ({placeholders}) AND path_length = 1",
+            chunk
+        )
+        for row in cursor:
+            parents[row['child_tag_id']].append(row['parent_tag_id'])
+
+    fetched = [Tag(id=row['id'], name=row['name'], direct_ancestors=parents.get(row['id'], [])) for row in rows]
+    if tag_cache is not None and tag_cache.can_store(conn):
+        for tag in fetched:
+            tag_cache.put(tag)
+    return found + fetched
+
+def load_tag_graph(conn: sqlite3.Connection) -> Tuple[List[Tag], Dict[int, List[int]], Dict[int, List[int]]]:
+    """
+    Load every tag and every direct relationship in two table scans.
+    
+    Args:
+        conn: Database connection to use
+    
+    Returns:
+        (tags, parents, children): the list of tags with their direct ancestors filled in,
+        and the direct parent ids and direct child ids of every tag, keyed by tag id
+    """
+    parents: Dict[int, List[int]] = defaultdict(list)
+    children: Dict[int, List[int]] = defaultdict(list)
+    cursor = conn.execute("SELECT parent_tag_id, child_tag_id FROM tag_relationships WHERE path_length = 1")
+    for row in cursor:
+        parents[row['child_tag_id']].append(row['parent_tag_id'])
+        children[row['parent_tag_id']].append(row['child_tag_id'])
+
+    cursor = conn.execute("SELECT id, name FROM tags")
+    tags = [Tag(id=row['id'], name=row['name'], direct_ancestors=list(parents.get(row['id'], []))) for row in cursor]
+    return tags, dict(parents), dict(children)
 
 def get_all_tags(conn: sqlite3.Connection) -> List[Tag]:
-    cursor = conn.execute("SELECT * FROM tags")
-    rows = cursor.fetchall()
-    return [Tag(id=row['id'], name=row['name'], direct_ancestors=get_direct_ancestors_ids(conn, row['id'])) for row in rows]
+    tags, _, _ = load_tag_graph(conn)
+    return tags
+
+def iter_tags_with_ancestor_names(conn: sqlite3.Connection, chunk_size: int = 1000) -> Iterator[Tuple[int, str, str]]:
+    """
+    Stream (id, name, space-separated direct ancestor names) for every tag, in ID order.
+    
+    Ancestor names are resolved with a join and rows are fetched chunk_size at a
+    time, so memory use does not grow with the number of tags.
+    
+    Args:
+        conn: Database connection to use
+        chunk_size: Number of rows fetched per round-trip
+    """
+    cursor = conn.execute("""
+        SELECT t.id, t.name, group_concat(p.name, ' ') AS ancestor_names
+        FROM tags t
+        LEFT JOIN tag_relationships r ON r.child_tag_id = t.id AND r.path_length = 1
+        LEFT JOIN tags p ON p.id = r.parent_tag_id
+        GROUP BY t.id
+        ORDER BY t.id
+    """)
+    while True:
+        rows = cursor.fetchmany(chunk_size)
+        if not rows:
+            break
+        for row in rows:
+            yield row['id'], row['name'], row['ancestor_names'] or ""
@@ -0,0 +1,193 @@
+"""
+Incremental sync of tags between databases, driven by the tag_changes log.
+
+export_changes writes only the tags changed after a given sequence number;
+import_changes applies such a file to a replica. Rows carry tag IDs rather
+than names (for both the tag and its ancestors), so replicas keep the IDs of
+the source database and a rename touches a single row.
+
+Format: seq, id, name, direct_ancestor_ids, deleted
+- seq: sequence number of the latest change of the tag
+- id: tag ID
+- name: tag name (empty for deleted tags)
+- direct_ancestor_ids: space-separated ancestor IDs
+- deleted: 1 for deleted tags (tombstones), 0 otherwise
+"""
+from collections import Counter
+import csv
+from dataclasses import dataclass
+from pathlib import Path
+import sqlite3
+from typing import Dict, List, Optional
+
+from tags import db, graph
+from tags.sync import CsvTag, SyncResult, combined_graph, open_input, open_output
+from tags.utils import toposort
+
+CHANGE_COLUMNS = ['seq', 'id', 'name', 'direct_ancestor_ids', 'deleted']
+
+
+@dataclass
+class TagChange:
+    seq: int
+    id: int
+    name: str
+    ancestor_ids: List[int]
+    deleted: bool
+
+
+def read_changes(csv_path: Path) -> List[TagChange]:
+    with open_input(csv_path) as f:
+        return [
+            TagChange(
+                seq=int(row['seq']),
+                id=int(row['id']),
+                name=row['name'].strip(),
+                ancestor_ids=[int(ancestor_id) for ancestor_id in row['direct_ancestor_ids'].split()],
+                deleted=row['deleted'].strip() == '1',
+            )
+            for row in csv.DictReader(f)
+        ]
+
+
+def export_changes(db_path: Path, csv_path: Path, since: int = 0, compression: Optional[str] = None) -> int:
+    """
+    Export the tags changed after seq since, one row per tag in its current state.
+
+    Args:
+        db_path: Path to the database
+        csv_path: Path to the CSV file, or "-" for stdout
+        since: Latest sequence number the consumer has applied (0 exports every tag)
+        compression: None, "gzip" or "zstd" (the latter needs the zstandard package)
+
+    Returns:
+        The latest sequence number exported, to pass as since next time
+    """
+    last_seq = since
+    with db.transaction(db_path, dry_run=False) as conn, open_output(csv_path, compression) as f:
+        writer = csv.writer(f)
+        writer.writerow(CHANGE_COLUMNS)
+        for seq, tag_id, name, ancestor_ids, deleted in db.iter_changes_since(conn, since):
+            writer.writerow([seq, tag_id, name or "", " ".join(map(str, ancestor_ids)), int(deleted)])
+            last_seq = seq
+    return last_seq
+
+
+def validate_changes(tag_graph: graph.TagGraph, upserts: List[TagChange], deleted_ids: List[int]) -> List[str]:
+    """
+    Check that applying the changes leaves tag names unique and the hierarchy acyclic.
+
+    The changes are turned into CSV rows naming their ancestors by their names
+    after the import, so the check is the one bulk_sync.validate_batch runs.
+    Every ancestor must already be known to exist.
+
+    Args:
+        tag_graph: Graph of the tags currently in the database
+        upserts: Changes that add or update a tag
+        deleted_ids: IDs of the database tags being deleted
+
+    Returns:
+        List of error messages (empty if valid)
+    """
+    errors = []
+
+    # Nodes of the resulting graph: the upserted tags first, then the database
+    # tags the changes leave untouched.
+    replaced_ids = {change.id for change in upserts} | set(deleted_ids)
+    kept_ids = [tag_id for tag_id in tag_graph.names if tag_id not in replaced_ids]
+    final_names = {tag_id: tag_graph.name(tag_id) for tag_id in kept_ids}
+    final_names.update((change.id, change.name) for change in upserts)
+    names = [change.name for change in upserts] + [tag_graph.name(tag_id) for tag_id in kept_ids]
+    for name, count in Counter(names).items():
+        if count > 1:
+            errors.append(f"Tag name '{name}' is used by {count} tags")
+    if errors:
+        # Ancestors are resolved by name below, which needs unique names.
+        return errors
+
+    csv_tags = [
+        CsvTag(id=change.id, name=change.name, ancestor_names=[final_names[ancestor_id] for ancestor_id in change.ancestor_ids])
+        for change in upserts
+    ]
+    parents, row_errors = combined_graph(tag_graph, csv_tags, kept_ids)
+    for index in sorted(row_errors):
+        errors.extend(row_errors[index])
+
+    order, cyclic = toposort.topological_sort(parents)
+    for node in sorted(cyclic):
+        errors.append(f"Cycle detected: Tag '{names[node]}' is its own ancestor")
+    ordered = set(order)
+    for node in range(len(csv_tags)):
+        if node not in ordered and node not in cyclic:
+            errors.append(f"Tag '{names[node]}' is below a cycle")
+
+    return errors
+
+
+def import_changes(db_path: Path, csv_path: Path, dry_run: bool = False) -> SyncResult:
+    """
+    Apply a file written by export_changes to a replica, as one transaction.
+
+    Only the tags listed in the file are written. The replica's hierarchy is
+    loaded once to check that the result stays acyclic, as bulk_sync does.
+    Tombstones of tags the replica never had are ignored.
+
+    Args:
+        db_path: Path to the database
+        csv_path: Path to the CSV file
+        dry_run: If True, don't actually modify the database, just report what would happen
+
+    Returns:
+        SyncResult with statistics about the sync operation and the latest seq
+        applied. If any row is invalid, only errors are reported and the database
+        is left untouched.
+    """
+    result = SyncResult()
+    changes = read_changes(csv_path)
+
+    with db.transaction(db_path, dry_run=dry_run) as conn:
+        upserts = [change for change in changes if not change.deleted]
+        referenced_ids = {change.id for change in changes}
+        referenced_ids.update(ancestor_id for change in upserts for ancestor_id in change.ancestor_ids)
+        existing_tags = db.get_tags_by_ids(conn, referenced_ids)
+
+        deleted_ids = [change.id for change in changes if change.deleted and change.id in existing_tags]
+        remaining_ids = (set(existing_tags) - set(deleted_ids)) | {change.id for change in upserts}
+        for change in upserts:
+            for ancestor_id in change.ancestor_ids:
+                if ancestor_id not in remaining_ids:
+                    result.errors.append(f"Ancestor tag {ancestor_id} of '{change.name}' not found")
+        if result.errors:
+            return result
+        result.errors = validate_changes(graph.get_graph(conn), upserts, deleted_ids)
+        if result.errors:
+            return result
+
+        new_names = {change.id: change.name for change in upserts if change.id not in existing_tags}
+        renames = {
+            change.id: change.name
+            for change in upserts
+            if change.id in existing_tags and change.name != existing_tags[change.id].name
+        }
+        ancestors: Dict[int, List[int]] = {
+            change.id: change.ancestor_ids
+            for change in upserts
+            if change.id in new_names or set(change.ancestor_ids) != set(existing_tags[change.id].direct_ancestors)
+        }
+        try:
+            db.delete_tags(conn, deleted_ids)
+            db.rename_tags(conn, renames)
+            db.insert_tags_with_ids(conn, new_names)
+            db.set_direct_ancestors(conn, ancestors)
+        except sqlite3.IntegrityError as e:
+            conn.rollback()
+            result.errors.append(f"Changes conflict with the replica: {e}")
+            return result
+
+        result.added = len(new_names)
+        result.deleted = len(deleted_ids)
+        result.updated = len(set(renames) | (set(ancestors) - set(new_names)))
+        result.unchanged = len(upserts) - result.added - result.updated
+        result.last_seq = max((change.seq for change in changes), default=None)
+
+    return result
@@ -0,0 +1,123 @@
+"""
+In-memory view of the tag hierarchy.
+
+A TagGraph is loaded once per connection (in two table scans) the first time
+validation or traversal needs it. tags.db patches it on every add_tag,
+update_tag and delete_tag, and db.transaction drops it when the transaction ends.
+"""
+from collections import deque
+import sqlite3
+from typing import Deque, Dict, Iterable, List, Optional, Set, Tuple
+
+from tags.tag import Tag
+import tags.db as db
+
+
+class TagGraph:
+    def __init__(self, names: Dict[int, str], parents: Dict[int, List[int]], children: Dict[int, List[int]]):
+        self.names = names
+        self.parents = parents
+        self.children = children
+
+    @classmethod
+    def load(cls, conn: sqlite3.Connection) -> "TagGraph":
+        tags, parents, children = db.load_tag_graph(conn)
+        return cls({tag.id: tag.name for tag in tags}, parents, children)
+
+    def __contains__(self, tag_id: int) -> bool:
+        return tag_id in self.names
+
+    def __len__(self) -> int:
+        return len(self.names)
+
+    def name(self, tag_id: int) -> str:
+        return self.names[tag_id]
+
+    def direct_ancestors(self, tag_id: int) -> List[int]:
+        return self.parents.get(tag_id, [])
+
+    def direct_descendants(self, tag_id: int) -> List[int]:
+        return self.children.get(tag_id, [])
+
+    def tags(self) -> List[Tag]:
+        return [
+            Tag(id=tag_id, name=name, direct_ancestors=list(self.direct_ancestors(tag_id)))
+            for tag_id, name in self.names.items()
+        ]
+
+    def descendants_among(self, tag_id: int, candidates: Iterable[int]) -> Set[int]:
+        """
+        Return the candidates that are descendants of tag_id (or tag_id itself).
+        The search stops as soon as every candidate has been found.
+        """
+        remaining = set(candidates)
+        found: Set[int] = set()
+        visited: Set[int] = set()
+        queue: Deque[int] = deque([tag_id])
+        while queue and remaining:
+            current_id = queue.popleft()
+            if current_id in visited:
+                continue
+            visited.add(current_id)
+            if current_id in remaining:
+                remaining.discard(current_id)
+                found.add(current_id)
+            queue.extend(child_id for child_id in self.direct_descendants(current_id) if child_id not in visited)
+        return found
+
+    # -- Patching --
+
+    def add(self, tag_id: int, name: str, direct_ancestors: List[int]):
+        self.names[tag_id] = name
+        self._link(tag_id, direct_ancestors)
+
+    def update(self, tag_id: int, name: str, direct_ancestors: List[int]):
+        self.names[tag_id] = name
+        self._unlink_parents(tag_id)
+        self._link(tag_id, direct_ancestors)
+
+    def remove(self, tag_id: int):
+        self.names.pop(tag_id, None)
+        self._unlink_parents(tag_id)
+        for child_id in self.children.pop(tag_id, []):
+            self.parents[child_id].remove(tag_id)
+
+    def _link(self, tag_id: int, direct_ancestors: List[int]):
+        parents = list(dict.fromkeys(direct_ancestors))
+        if parents:
+            self.parents[tag_id] = parents
+        for parent_id in parents:
+            self.children.setdefault(parent_id, []).append(tag_id)
+
+    def _unlink_parents(self, tag_id: int):
+        for parent_id in self.parents.pop(tag_id, []):
+            self.children[parent_id].remove(tag_id)
+
+
+# -- Per-connection cache --
+#
+# sqlite3.Connection supports neither attributes nor weak references, so graphs
+# are keyed by id(conn) and hold the connection itself to keep the id from being reused.
+
+_graphs: Dict[int, Tuple[sqlite3.Connection, TagGraph]] = {}
+
+
+def get_graph(conn: sqlite3.Connection) -> TagGraph:
+    """Return the graph of this connection, loading it on first use."""
+    graph = cached_graph(conn)
+    if graph is None:
+        graph = TagGraph.load(conn)
+        _graphs[id(conn)] = (conn, graph)
+    return graph
+
+
+def cached_graph(conn: sqlite3.Connection) -> Optional[TagGraph]:
+    """Return the graph of this connection if it has been loaded, without loading it."""
+    entry = _graphs.get(id(conn))
+    if entry is None or entry[0] is not conn:
+        return None
+    return entry[1]
+
+
+def discard_graph(conn: sqlite3.Connection):
+    _graphs.pop(id(conn), None)
@@ -3,8 +3,10 @@ Export tags from database to CSV file.
 """
 import argparse
 from pathlib import Path
+import sys
 
-from .. import sync
+from common import instrument
+from .. import delta_sync, sync
 
 
 def parse_args():
@@ -17,17 +19,38 @@ def parse_args():
     p.add_argument(
         "--csv-file", dest="csv_file",
         type=Path, required=True,
-        help="The CSV file to export to",
+        help="The CSV file to export to, or - for stdout",
     )
+    p.add_argument(
+        "--stream", dest="stream",
+        action="store_true",
+        help="Stream rows in chunks instead of loading every tag into memory",
+    )
+    p.add_argument(
+        "--compression", dest="compression",
+        choices=sync.COMPRESSIONS, default=None,
+        help="Compress the output (zstd needs the zstandard package)",
+    )
+    p.add_argument(
+        "--since", dest="since",
+        type=int, default=None,
+        help="Only export the tags changed after this change sequence number (a delta for import_from_csv --delta)",
+    )
+    instrument.add_profile_argument(p)
     return p.parse_args()
 
 
 def main():
     args = parse_args()
-    sync.export_to_csv(args.db_path, args.csv_file)
-    print(f"Exported tags to {args.csv_file}")
+    with instrument.profiling(args.profile):
+        if args.since is not None:
+            last_seq = delta_sync.export_changes(args.db_path, args.csv_file, args.since, compression=args.compression)
+            print(f"Exported changes {args.since + 1} to {last_seq}", file=sys.stderr)
+            return
+        sync.export_to_csv(args.db_path, args.csv_file, stream=args.stream, compression=args.compression)
+        if str(args.csv_file) != "-":
+            print(f"Exported tags to {args.csv_file}")
 
 
 if __name__ == "__main__":
     main()
-
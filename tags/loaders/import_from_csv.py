@@ -4,8 +4,9 @@ Import tags from CSV file to database with two-way sync.
 import argparse
 from pathlib import Path
 
+from common import instrument
 from tags.utils import tree
-from tags import sync, db
+from tags import bulk_sync, delta_sync, sync, db
 
 
 def parse_args():
@@ -23,36 +24,61 @@ def parse_args():
     p.add_argument(
         "--delete-missing", dest="delete_missing",
         action="store_true",
-        help="Delete tags from database that are not in CSV",
+        help="Delete tags from database that are not in CSV, except those time-log entries use",
     )
     p.add_argument(
         "-n", "--dry-run", dest="dry_run",
         action="store_true",
         help="Don't modify database, just report what would happen",
     )
-    return p.parse_args()
+    p.add_argument(
+        "--bulk", dest="bulk",
+        action="store_true",
+        help="Validate the whole CSV up front and write it in batches (all-or-nothing)",
+    )
+    p.add_argument(
+        "--delta", dest="delta",
+        action="store_true",
+        help="The CSV file is a delta written by export_to_csv --since; apply it as one batch",
+    )
+    instrument.add_profile_argument(p)
+    args = p.parse_args()
+    if args.delta and args.delete_missing:
+        # A delta lists only the changed tags; its deletions come as tombstones.
+        p.error("--delta cannot be combined with --delete-missing")
+    return args
 
 
 def main():
     args = parse_args()
-    result = sync.import_from_csv(
-        args.db_path,
-        args.csv_file,
-        delete_missing=args.delete_missing,
-        dry_run=args.dry_run
-    )
-    
-    print(f"\nSync results:")
-    print(f"  Added: {result.added}")
-    print(f"  Updated: {result.updated}")
-    print(f"  Deleted: {result.deleted}")
-    
-    if result.errors:
-        print(f"\nErrors ({len(result.errors)}):")
-        for error in result.errors:
-            print(f"  - {error}")
-    else:
-        print("\nNo errors!")
+    with instrument.profiling(args.profile):
+        if args.delta:
+            result = delta_sync.import_changes(args.db_path, args.csv_file, dry_run=args.dry_run)
+        else:
+            importer = bulk_sync if args.bulk else sync
+            result = importer.import_from_csv(
+                args.db_path,
+                args.csv_file,
+                delete_missing=args.delete_missing,
+                dry_run=args.dry_run
+            )
+
+        print(f"\nSync results:")
+        print(f"  Added: {result.added}")
+        print(f"  Updated: {result.updated}")
+        print(f"  Unchanged: {result.unchanged}")
+        print(f"  Deleted: {result.deleted}")
+        if result.kept_in_use:
+            print(f"  Kept (used by time logs): {result.kept_in_use}")
+        if result.last_seq is not None:
+            print(f"  Up to change: {result.last_seq}")
+
+        if result.errors:
+            print(f"\nErrors ({len(result.errors)}):")
+            for error in result.errors:
+                print(f"  - {error}")
+        else:
+            print("\nNo errors!")
 
 
 if __name__ == "__main__":
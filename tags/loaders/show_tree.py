@@ -0,0 +1,46 @@
+"""
+Print the tag hierarchy, or a subtree of it.
+"""
+import argparse
+from pathlib import Path
+import sys
+
+from tags.utils import tree
+from tags import db
+
+
+def parse_args():
+    p = argparse.ArgumentParser(description="Print the tag hierarchy")
+    p.add_argument(
+        "--db-path", dest="db_path",
+        type=Path, required=True,
+        help="The path to the database file",
+    )
+    p.add_argument(
+        "--root", dest="root",
+        type=str, default=None,
+        help="Name of the tag to start from (defaults to the root tag)",
+    )
+    p.add_argument(
+        "--max-depth", dest="max_depth",
+        type=int, default=None,
+        help="Deepest level to print below the starting tag",
+    )
+    return p.parse_args()
+
+
+def main():
+    args = parse_args()
+    with db.transaction(args.db_path, dry_run=True) as conn:
+        start_tag_id = 1
+        if args.root is not None:
+            tag = db.get_tag_by_name(conn, args.root)
+            if tag is None:
+                print(f"Tag '{args.root}' not found", file=sys.stderr)
+                sys.exit(1)
+            start_tag_id = tag.id
+        tree.show_tree(conn, start_tag_id, max_depth=args.max_depth)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,57 @@
+"""
+Versioned schema migrations of the tags package, applied by init_db on top of schema.sql.
+See common.migrations for how versions are tracked.
+"""
+import sqlite3
+from typing import List
+
+from common.migrations import Migration
+import tags.db as db
+
+
+def add_relationship_indexes(conn: sqlite3.Connection):
+    """
+    Index tag_relationships for the lookups tags.db performs, and make each
+    (parent, child) pair unique. Duplicate pairs written by older versions are dropped first.
+    """
+    conn.execute("""
+        DELETE FROM tag_relationships WHERE id NOT IN (
+            SELECT MIN(id) FROM tag_relationships GROUP BY parent_tag_id, child_tag_id
+        )
+    """)
+    conn.execute(
+        "CREATE UNIQUE INDEX IF NOT EXISTS idx_tag_relationships_pair "
+        "ON tag_relationships (parent_tag_id, child_tag_id)"
+    )
+    conn.execute(
+        "CREATE INDEX IF NOT EXISTS idx_tag_relationships_child "
+        "ON tag_relationships (child_tag_id, path_length, parent_tag_id)"
+    )
+    conn.execute(
+        "CREATE INDEX IF NOT EXISTS idx_tag_relationships_parent "
+        "ON tag_relationships (parent_tag_id, path_length, child_tag_id)"
+    )
+
+
+def backfill_closure(conn: sqlite3.Connection):
+    """Databases written before the closure was maintained only hold direct edges."""
+    db.rebuild_closure(conn)
+
+
+def add_change_log(conn: sqlite3.Connection):
+    """Change log read by incremental exports, starting with one entry per existing tag."""
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS tag_changes (
+            seq INTEGER PRIMARY KEY AUTOINCREMENT,
+            tag_id INTEGER NOT NULL,
+            deleted INTEGER NOT NULL DEFAULT 0
+        )
+    """)
+    conn.execute("INSERT INTO tag_changes (tag_id) SELECT id FROM tags ORDER BY id")
+
+
+TAGS_MIGRATIONS: List[Migration] = [
+    add_relationship_indexes,
+    backfill_closure,
+    add_change_log,
+]
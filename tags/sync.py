@@ -1,15 +1,18 @@
 """
 Two-way sync between database and CSV files for tag management.
 """
-from collections import defaultdict
+from contextlib import contextmanager
 import csv
+import gzip
+import io
 from pathlib import Path
-from typing import List, Dict, Set, Optional
+import sys
+from typing import List, Dict, Optional, TextIO, Tuple
 from dataclasses import dataclass
 
-from tags import db
+from tags import db, graph
 from tags.tag import Tag
-from tags.utils import tree
+from tags.utils import toposort, tree
 
 
 @dataclass
@@ -17,15 +20,167 @@ class SyncResult:
     """Results of a sync operation."""
     added: int = 0
     updated: int = 0
+    unchanged: int = 0
     deleted: int = 0
+    # Tags delete_missing left in place because time-log entries use them.
+    kept_in_use: int = 0
     errors: List[str] = None
+    # Delta imports only: the latest change sequence number applied.
+    last_seq: Optional[int] = None
     
     def __post_init__(self):
         if self.errors is None:
             self.errors = []
 
 
-def export_to_csv(db_path: Path, csv_path: Path):
+@dataclass
+class CsvTag:
+    id: Optional[int]
+    name: str
+    ancestor_names: List[str]
+
+
+def read_csv_tags(csv_path: Path) -> List[CsvTag]:
+    """
+    Read tags from CSV file.
+    Returns list of CsvTag objects with ancestor names (not IDs yet).
+    """
+    def _parse_row(row: Dict[str, str]) -> CsvTag:
+        tag_id_str = row.get('id', '').strip()
+        tag_id = int(tag_id_str) if tag_id_str else None
+        name = row.get('name', '').strip()
+        ancestor_str = row.get('direct_ancestors', '').strip()
+        ancestor_names = ancestor_str.split() if ancestor_str else []
+        return CsvTag(id=tag_id, name=name, ancestor_names=ancestor_names)
+    
+    with open_input(csv_path) as f:
+        reader = csv.DictReader(f)
+        return [_parse_row(row) for row in reader]
+
+
+def is_unchanged(existing_tag: Optional[Tag], name: str, ancestor_ids: List[int]) -> bool:
+    """Whether a CSV row matches the stored tag: same name and same set of direct ancestors."""
+    return (
+        existing_tag is not None
+        and existing_tag.name == name
+        and set(existing_tag.direct_ancestors) == set(ancestor_ids)
+    )
+
+
+def combined_graph(
+    tag_graph: graph.TagGraph,
+    csv_tags: List[CsvTag],
+    kept_ids: List[int]
+) -> Tuple[List[List[int]], Dict[int, List[str]]]:
+    """
+    Integer-indexed graph of the hierarchy that importing csv_tags would produce.
+
+    Node i is CSV row i for i < len(csv_tags), and node len(csv_tags) + j is the
+    database tag kept_ids[j]. Ancestor names resolve to CSV rows first, then to
+    the database tag of that name.
+
+    Args:
+        tag_graph: Graph of the tags currently in the database
+        csv_tags: Rows read from the CSV file
+        kept_ids: IDs of the database tags that stay in the graph besides the CSV rows
+
+    Returns:
+        (parents, row_errors): the parent nodes of every node, and the errors of each
+        CSV row with an unknown ancestor or a self-reference, keyed by row index
+    """
+    id_to_node: Dict[int, int] = {tag_id: len(csv_tags) + index for index, tag_id in enumerate(kept_ids)}
+    id_to_node.update((csv_tag.id, index) for index, csv_tag in enumerate(csv_tags) if csv_tag.id is not None)
+    name_to_node: Dict[str, Optional[int]] = {name: id_to_node.get(tag_id) for tag_id, name in tag_graph.names.items()}
+    name_to_node.update((csv_tag.name, index) for index, csv_tag in enumerate(csv_tags))
+
+    parents: List[List[int]] = []
+    row_errors: Dict[int, List[str]] = {}
+    for index, csv_tag in enumerate(csv_tags):
+        node_parents = []
+        for ancestor_name in csv_tag.ancestor_names:
+            node = name_to_node.get(ancestor_name)
+            if node is None:
+                row_errors.setdefault(index, []).append(f"Ancestor tag '{ancestor_name}' of '{csv_tag.name}' not found")
+            elif node == index:
+                row_errors.setdefault(index, []).append(f"Tag '{csv_tag.name}' cannot be its own ancestor")
+            else:
+                node_parents.append(node)
+        parents.append(node_parents)
+    for tag_id in kept_ids:
+        parents.append([id_to_node[parent_id] for parent_id in tag_graph.direct_ancestors(tag_id) if parent_id in id_to_node])
+    return parents, row_errors
+
+
+COMPRESSIONS = ("gzip", "zstd")
+
+
+@contextmanager
+def open_output(csv_path: Path, compression: Optional[str] = None) -> TextIO:
+    """
+    Open csv_path for writing CSV text, optionally compressed.
+    A path of "-" writes to stdout.
+    """
+    to_stdout = str(csv_path) == "-"
+    if compression is None:
+        if to_stdout:
+            yield sys.stdout
+            sys.stdout.flush()
+        else:
+            with open(csv_path, 'w', newline='', encoding='utf-8') as f:
+                yield f
+        return
+
+    if compression not in COMPRESSIONS:
+        raise ValueError(f"Unknown compression '{compression}', expected one of {', '.join(COMPRESSIONS)}")
+    raw = sys.stdout.buffer if to_stdout else open(csv_path, 'wb')
+    try:
+        if compression == "gzip":
+            compressed = gzip.GzipFile(fileobj=raw, mode='wb')
+        else:
+            try:
+                import zstandard
+            except ImportError:
+                raise RuntimeError("zstd compression requires the 'zstandard' package") from None
+            compressed = zstandard.ZstdCompressor().stream_writer(raw, closefd=False)
+        with io.TextIOWrapper(compressed, encoding='utf-8', newline='') as f:
+            yield f
+    finally:
+        if to_stdout:
+            raw.flush()
+        else:
+            raw.close()
+
+
+# Leading bytes of each compressed format, so readers need no --compression flag.
+MAGIC_BYTES = {"gzip": b"\x1f\x8b", "zstd": b"\x28\xb5\x2f\xfd"}
+
+
+@contextmanager
+def open_input(csv_path: Path) -> TextIO:
+    """
+    Open csv_path for reading CSV text, decompressing it if it was written
+    compressed by open_output (detected from its first bytes).
+    """
+    raw = open(csv_path, 'rb')
+    try:
+        magic = raw.peek(4)[:4]
+        if magic.startswith(MAGIC_BYTES["gzip"]):
+            compressed = gzip.GzipFile(fileobj=raw, mode='rb')
+        elif magic.startswith(MAGIC_BYTES["zstd"]):
+            try:
+                import zstandard
+            except ImportError:
+                raise RuntimeError("zstd compression requires the 'zstandard' package") from None
+            compressed = zstandard.ZstdDecompressor().stream_reader(raw, closefd=False)
+        else:
+            compressed = raw
+        with io.TextIOWrapper(compressed, encoding='utf-8', newline='') as f:
+            yield f
+    finally:
+        raw.close()
+
+
+def export_to_csv(db_path: Path, csv_path: Path, stream: bool = False, compression: Optional[str] = None):
     """
     Export all tags from database to CSV file.
     
@@ -33,21 +188,28 @@ def export_to_csv(db_path: Path, csv_path: Path):
     - id: tag ID (integer)
     - name: tag name
     - direct_ancestors: space-separated ancestor names
+    
+    Args:
+        db_path: Path to the database
+        csv_path: Path to the CSV file, or "-" for stdout
+        stream: If True, stream rows from the database in chunks instead of loading
+            the whole tag graph first, so memory stays flat however many tags there are
+        compression: None, "gzip" or "zstd" (the latter needs the zstandard package)
     """
-    with db.transaction(db_path, dry_run=False) as conn:
-        tags = db.get_all_tags(conn)
-        
-        id_to_name = {tag.id: tag.name for tag in tags}
-        
-        with open(csv_path, 'w', newline='', encoding='utf-8') as f:
-            writer = csv.writer(f)
-            writer.writerow(['id', 'name', 'direct_ancestors'])
+    with db.transaction(db_path, dry_run=False) as conn, open_output(csv_path, compression) as f:
+        writer = csv.writer(f)
+        writer.writerow(['id', 'name', 'direct_ancestors'])
+
+        if stream:
+            writer.writerows(db.iter_tags_with_ancestor_names(conn))
+            return
+
+        tag_graph = graph.get_graph(conn)
+        for tag in tag_graph.tags():
+            ancestor_names = [tag_graph.name(aid) for aid in tag.direct_ancestors]
+            ancestor_str = " ".join(ancestor_names) if ancestor_names else ""
             
-            for tag in tags:
-                ancestor_names = [id_to_name[aid] for aid in tag.direct_ancestors]
-                ancestor_str = " ".join(ancestor_names) if ancestor_names else ""
-                
-                writer.writerow([tag.id, tag.name, ancestor_str])
+            writer.writerow([tag.id, tag.name, ancestor_str])
 
 
 def import_from_csv(
@@ -62,7 +224,8 @@ def import_from_csv(
     Args:
         db_path: Path to the database
         csv_path: Path to the CSV file
-        delete_missing: If True, delete tags from DB that are not in CSV
+        delete_missing: If True, delete tags from DB that are not in CSV, except
+            those time-log entries use
         dry_run: If True, don't actually modify the database, just report what would happen
     
     Returns:
@@ -70,84 +233,64 @@ def import_from_csv(
     """
     result = SyncResult()
 
-    @dataclass
-    class CsvTag:
-        id: Optional[int]
-        name: str
-        ancestor_names: List[str]
-
-    def _read_csv_tags(csv_path: Path) -> List[CsvTag]:
-        """
-        Read tags from CSV file.
-        Returns list of CsvTag objects with ancestor names (not IDs yet).
-        """
-        def _parse_row(row: Dict[str, str]) -> CsvTag:
-            tag_id_str = row.get('id', '').strip()
-            tag_id = int(tag_id_str) if tag_id_str else None
-            name = row.get('name', '').strip()
-            ancestor_str = row.get('direct_ancestors', '').strip()
-            ancestor_names = ancestor_str.split() if ancestor_str else []
-            return CsvTag(id=tag_id, name=name, ancestor_names=ancestor_names)
-        
-        with open(csv_path, 'r', newline='', encoding='utf-8') as f:
-            reader = csv.DictReader(f)
-            return [_parse_row(row) for row in reader]
-
-    csv_tags = _read_csv_tags(csv_path)
+    csv_tags = read_csv_tags(csv_path)
     csv_ids = {tag.id for tag in csv_tags if tag.id is not None}
-    csv_names = {tag.name for tag in csv_tags}
-    name_to_index = {tag.name: index for index, tag in enumerate(csv_tags)}
     
     with db.transaction(db_path, dry_run=False) as read_conn:
-        existing_tags = {tag.id: tag for tag in db.get_all_tags(read_conn)}
-    name_to_id = {tag.name: tag.id for tag in existing_tags.values()}
-    
-    dependency_graph = defaultdict(list)
+        tag_graph = graph.get_graph(read_conn)
+        existing_tags = {tag.id: tag for tag in tag_graph.tags()}
+        # Deletions happen last, so every database tag is still there while rows are written.
+        kept_ids = [tag_id for tag_id in existing_tags if tag_id not in csv_ids]
+        parents, row_errors = combined_graph(tag_graph, csv_tags, kept_ids)
 
-    for csv_tag in csv_tags:
-        for ancestor_name in csv_tag.ancestor_names:
-            if ancestor_name not in name_to_id:
-                dependency_graph[csv_tag.name].append(ancestor_name)
+    # Order the whole combined graph once: parents come before their children,
+    # and every cycle is found in the same pass instead of row by row.
+    order, cyclic = toposort.topological_sort(parents)
+    for node in sorted(cyclic):
+        if node < len(csv_tags):
+            row_errors.setdefault(node, []).append(f"Cycle detected: Tag '{csv_tags[node].name}' is its own ancestor")
+    ordered = set(order)
+    for index, csv_tag in enumerate(csv_tags):
+        if index not in ordered and index not in cyclic:
+            row_errors.setdefault(index, []).append(f"Tag '{csv_tag.name}' skipped: it is below a cycle")
+    for index in sorted(row_errors):
+        result.errors.extend(row_errors[index])
+
+    def _node_id(node: int) -> Optional[int]:
+        return csv_tags[node].id if node < len(csv_tags) else kept_ids[node - len(csv_tags)]
 
-    dependency_graph = dict(dependency_graph)
-    
-    visited: Set[int] = set()
-    topological_order: List[int] = []
-
-    def _dfs(tag_name: str):
-        visited.add(tag_name)
-        children = dependency_graph.get(tag_name, [])
-        for child in children:
-            if child not in visited:
-                _dfs(child)
-        topological_order.append(tag_name)
-    
-    for tag_name in csv_names:
-        if tag_name not in visited:
-            _dfs(tag_name)
-    
     with db.transaction(db_path, dry_run=dry_run) as conn:
-        for tag_name in topological_order:
-            csv_tag = csv_tags[name_to_index[tag_name]]
+        for index in order:
+            if index >= len(csv_tags) or index in row_errors:
+                continue
+            csv_tag = csv_tags[index]
+            ancestor_ids = [_node_id(node) for node in parents[index]]
+            if None in ancestor_ids:
+                result.errors.append(f"Tag '{csv_tag.name}' skipped: one of its ancestors could not be added")
+                continue
             if csv_tag.id is None:
                 result.added += 1
-                ancestor_ids = [name_to_id[ancestor_name] for ancestor_name in csv_tag.ancestor_names]
                 response = db.add_tag(conn, Tag(name=csv_tag.name, direct_ancestors=ancestor_ids))
                 if isinstance(response, list):
                     result.errors.extend(response)
                 else:
                     csv_tag.id = response
-                    name_to_id[csv_tag.name] = response
             else:
+                existing_tag = existing_tags.get(csv_tag.id)
+                if is_unchanged(existing_tag, csv_tag.name, ancestor_ids):
+                    result.unchanged += 1
+                    continue
                 result.updated += 1
-                ancestor_ids = [name_to_id[ancestor_name] for ancestor_name in csv_tag.ancestor_names]
                 response = db.update_tag(conn, Tag(id=csv_tag.id, name=csv_tag.name, direct_ancestors=ancestor_ids))
                 if isinstance(response, list):
                     result.errors.extend(response)
 
         if delete_missing:
-            for tag_id in existing_tags.keys():
-                if tag_id in csv_ids:
+            missing_ids = [tag_id for tag_id in existing_tags if tag_id not in csv_ids]
+            in_use_ids = db.get_ids_used_by_time_logs(conn, missing_ids)
+            result.kept_in_use = len(in_use_ids)
+            for tag_id in missing_ids:
+                if tag_id in in_use_ids:
                     continue
                 result.deleted += 1
                 db.delete_tag(conn, tag_id)
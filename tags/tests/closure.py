@@ -0,0 +1,131 @@
+"""
+Manual checks of the closure table maintenance and of cycle reporting:
+
+    python -m tags.tests.closure [--seed N] [--sequences N] [--steps N]
+
+Random add/update/delete sequences are applied to a scratch in-memory database,
+and after every step the closure kept incrementally by tags.db must equal the
+one rebuild_closure computes from the direct relationships alone.
+"""
+import argparse
+import random
+import sqlite3
+from typing import Dict, List, Set, Tuple
+
+from .. import db
+from ..tag import Tag
+from ..utils import toposort
+
+def parse_args():
+    p = argparse.ArgumentParser()
+    p.add_argument(
+        "--seed", dest="seed",
+        type=int, default=0,
+        help="Random seed of the first sequence",
+    )
+    p.add_argument(
+        "--sequences", dest="sequences",
+        type=int, default=20,
+        help="Number of random sequences to run",
+    )
+    p.add_argument(
+        "--steps", dest="steps",
+        type=int, default=200,
+        help="Number of writes per sequence",
+    )
+    return p.parse_args()
+
+def _closure_rows(conn: sqlite3.Connection) -> Dict[Tuple[int, int], int]:
+    rows = conn.execute("SELECT parent_tag_id, child_tag_id, path_length FROM tag_relationships").fetchall()
+    closure = {(row['parent_tag_id'], row['child_tag_id']): row['path_length'] for row in rows}
+    assert len(closure) == len(rows), "duplicate closure rows"
+    return closure
+
+def _rebuilt_closure(conn: sqlite3.Connection) -> Dict[Tuple[int, int], int]:
+    """The closure rebuild_closure computes, without keeping it."""
+    conn.execute("SAVEPOINT rebuild")
+    try:
+        conn.execute("DELETE FROM tag_relationships WHERE path_length > 1")
+        db.rebuild_closure(conn)
+        return _closure_rows(conn)
+    finally:
+        conn.execute("ROLLBACK TO rebuild")
+        conn.execute("RELEASE rebuild")
+
+def _random_step(conn: sqlite3.Connection, rng: random.Random, ids: List[int], step: int):
+    op = rng.random()
+    if op < 0.4 or len(ids) < 3:
+        ancestors = rng.sample(ids, min(len(ids), rng.randint(0, 3)))
+        tag_id = db.add_tag(conn, Tag(name=f"t{step}", direct_ancestors=ancestors))
+        assert not isinstance(tag_id, list), tag_id
+        ids.append(tag_id)
+    elif op < 0.6:
+        tag_id = rng.choice(ids)
+        current = db.get_tag_by_id(conn, tag_id)
+        db.update_tag(conn, Tag(id=tag_id, name=f"r{step}", direct_ancestors=current.direct_ancestors))
+    elif op < 0.8:
+        tag_id = rng.choice(ids)
+        ancestors = rng.sample(ids, min(len(ids), rng.randint(0, 3)))
+        errors = db.update_tag(conn, Tag(id=tag_id, name=f"u{step}", direct_ancestors=ancestors))
+        if errors:
+            assert all("Cycle" in error or "own ancestor" in error for error in errors), errors
+    elif op < 0.9:
+        # Bulk re-parenting, which does not validate: new parents are never
+        # below any re-parented tag, so no cycle can close.
+        candidates = rng.sample(ids, min(len(ids), 3))
+        below = set(candidates)
+        for tag_id in candidates:
+            below.update(db.get_all_descendants_ids(conn, tag_id))
+        allowed = [tag_id for tag_id in ids if tag_id not in below]
+        db.set_direct_ancestors(conn, {
+            tag_id: rng.sample(allowed, min(len(allowed), rng.randint(0, 2)))
+            for tag_id in candidates
+        })
+    elif op < 0.95:
+        tag_id = rng.choice(ids)
+        ids.remove(tag_id)
+        db.delete_tag(conn, tag_id)
+    else:
+        deleted = set(rng.sample(ids, min(len(ids) - 1, 2)))
+        ids[:] = [tag_id for tag_id in ids if tag_id not in deleted]
+        db.delete_tags(conn, deleted)
+
+def test_incremental_closure(seed: int, steps: int):
+    rng = random.Random(seed)
+    conn = sqlite3.connect(":memory:")
+    conn.row_factory = sqlite3.Row
+    db.init_db(conn)
+    ids: List[int] = []
+    for step in range(steps):
+        _random_step(conn, rng, ids, step)
+        assert _closure_rows(conn) == _rebuilt_closure(conn), f"seed {seed}, step {step}"
+    conn.close()
+
+# (parents, expected cyclic nodes, expected unordered nodes that are not cyclic)
+KNOWN_GRAPHS: List[Tuple[List[List[int]], Set[int], Set[int]]] = [
+    ([[], [0], [1], [0, 2]], set(), set()),
+    ([[1], [0], [1], [2, 4], [3]], {0, 1, 3, 4}, {2}),
+    ([[0], [0]], {0}, {1}),
+    ([[1], [2], [0], [], [2, 3]], {0, 1, 2}, {4}),
+    ([[1], [0], [0], [2, 4], [3], [], [5]], {0, 1, 3, 4}, {2}),
+]
+
+def test_cycle_reporting():
+    for parents, expected_cyclic, expected_below in KNOWN_GRAPHS:
+        order, cyclic = toposort.topological_sort(parents)
+        assert cyclic == expected_cyclic, (parents, cyclic)
+        below = set(range(len(parents))) - set(order) - cyclic
+        assert below == expected_below, (parents, below)
+        position = {node: index for index, node in enumerate(order)}
+        for node in order:
+            assert all(position[parent] < position[node] for parent in parents[node]), (parents, order)
+
+def all_tests():
+    args = parse_args()
+    test_cycle_reporting()
+    for seed in range(args.seed, args.seed + args.sequences):
+        test_incremental_closure(seed, args.steps)
+    print("ok")
+
+if __name__ == "__main__":
+    all_tests()
@@ -0,0 +1,93 @@
+from collections import deque
+from typing import Deque, Dict, List, Set, Tuple
+
+
+def topological_sort(parents: List[List[int]]) -> Tuple[List[int], Set[int]]:
+    """
+    Order the nodes 0..n-1 of a graph so that every node comes after its parents,
+    using Kahn's algorithm. Runs in O(V + E) and never recurses.
+    
+    Args:
+        parents: parents[i] lists the parent indices of node i
+    
+    Returns:
+        (order, cyclic): the nodes that could be ordered, and the nodes lying on a
+        cycle. Nodes that only hang below a cycle (or between two cycles) are in neither.
+    """
+    node_count = len(parents)
+    children: List[List[int]] = [[] for _ in range(node_count)]
+    pending_parents = [0] * node_count
+    for node, node_parents in enumerate(parents):
+        for parent in node_parents:
+            children[parent].append(node)
+            pending_parents[node] += 1
+
+    order: List[int] = []
+    queue: Deque[int] = deque(node for node in range(node_count) if pending_parents[node] == 0)
+    while queue:
+        node = queue.popleft()
+        order.append(node)
+        for child in children[node]:
+            pending_parents[child] -= 1
+            if pending_parents[child] == 0:
+                queue.append(child)
+
+    if len(order) == node_count:
+        return order, set()
+
+    # Every unordered node is on a cycle or below one. The ones on a cycle are
+    # those in a strongly connected component of two or more nodes, or with an
+    # edge to themselves.
+    unordered = set(range(node_count)) - set(order)
+    cyclic: Set[int] = set()
+    for component in _strongly_connected_components(children, unordered):
+        if len(component) > 1 or component[0] in parents[component[0]]:
+            cyclic.update(component)
+    return order, cyclic
+
+
+def _strongly_connected_components(children: List[List[int]], nodes: Set[int]) -> List[List[int]]:
+    """Tarjan's algorithm over the subgraph induced by nodes, with an explicit stack instead of recursion."""
+    index: Dict[int, int] = {}
+    low: Dict[int, int] = {}
+    on_stack: Set[int] = set()
+    stack: List[int] = []
+    components: List[List[int]] = []
+    for root in nodes:
+        if root in index:
+            continue
+        index[root] = low[root] = len(index)
+        stack.append(root)
+        on_stack.add(root)
+        # Each frame is a node and the position of the next child to visit.
+        frames: List[Tuple[int, int]] = [(root, 0)]
+        while frames:
+            node, position = frames[-1]
+            node_children = children[node]
+            while position < len(node_children) and node_children[position] not in nodes:
+                position += 1
+            if position < len(node_children):
+                frames[-1] = (node, position + 1)
+                child = node_children[position]
+                if child not in index:
+                    index[child] = low[child] = len(index)
+                    stack.append(child)
+                    on_stack.add(child)
+                    frames.append((child, 0))
+                elif child in on_stack:
+                    low[node] = min(low[node], index[child])
+                continue
+            frames.pop()
+            if frames:
+                parent = frames[-1][0]
+                low[parent] = min(low[parent], low[node])
+            if low[node] == index[node]:
+                component = []
+                while True:
+                    member = stack.pop()
+                    on_stack.discard(member)
+                    component.append(member)
+                    if member == node:
+                        break
+                components.append(component)
+    return components
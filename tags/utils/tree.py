@@ -1,25 +1,43 @@
-from typing import List
-from pathlib import Path
 import sqlite3
-from .. import db
+import sys
+from typing import List, Optional, Set, TextIO, Tuple
+from .. import graph
 
-def show_tree(conn: sqlite3.Connection, start_tag_id: int):
-    visited_edges = set[int]()
-    depth = 0
+def show_tree(
+    conn: sqlite3.Connection,
+    start_tag_id: int,
+    max_depth: Optional[int] = None,
+    out: Optional[TextIO] = None
+):
+    """
+    Print the hierarchy below start_tag_id, one indented line per tag.
 
-    def dfs(tag_id: int):
-        nonlocal depth
-        tag = db.get_tag_by_id(conn, tag_id)
-        print(f"{'  ' * depth}{tag.name}")
+    The walk is iterative and reads from the cached TagGraph, so it needs no
+    queries beyond the initial graph load. A tag reachable through several
+    parents is expanded the first time only; later occurrences are printed
+    as a back-reference ("name ^") instead of repeating its subtree.
 
-        descendants_ids = db.get_direct_descendants_ids(conn, tag_id)
-        for descendant_id in descendants_ids:
-            if (tag_id, descendant_id) in visited_edges:
-                continue
-            visited_edges.add((tag_id, descendant_id))
-            tag = db.get_tag_by_id(conn, tag_id)
-            depth += 1
-            dfs(descendant_id)
-            depth -= 1
+    Args:
+        conn: Database connection
+        start_tag_id: Root of the subtree to print
+        max_depth: Deepest level to print below the root (None for no limit)
+        out: Stream to write to, line by line (defaults to stdout)
+    """
+    out = out if out is not None else sys.stdout
+    tag_graph = graph.get_graph(conn)
+    if start_tag_id not in tag_graph:
+        return
 
-    dfs(start_tag_id)
+    expanded: Set[int] = set()
+    stack: List[Tuple[int, int]] = [(start_tag_id, 0)]
+    while stack:
+        tag_id, depth = stack.pop()
+        children = tag_graph.direct_descendants(tag_id)
+        if tag_id in expanded and children:
+            out.write(f"{'  ' * depth}{tag_graph.name(tag_id)} ^\n")
+            continue
+        out.write(f"{'  ' * depth}{tag_graph.name(tag_id)}\n")
+        if max_depth is not None and depth >= max_depth:
+            continue
+        expanded.add(tag_id)
+        stack.extend((child_id, depth + 1) for child_id in reversed(children))
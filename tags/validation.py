@@ -1,9 +1,8 @@
-from typing import Deque, List, Set
+from typing import List
 import sqlite3
-from collections import deque
 
+from tags import graph
 from tags.tag import Tag
-import tags.db as db
 
 
 def check_ancestors_exist(conn: sqlite3.Connection, tag: Tag) -> List[str]:
@@ -16,8 +15,12 @@ def check_ancestors_exist(conn: sqlite3.Connection, tag: Tag) -> List[str]:
         tag: Tag to validate
     """
     errors = []
+    if not tag.direct_ancestors:
+        return errors
+
+    tag_graph = graph.get_graph(conn)
     for ancestor_id in tag.direct_ancestors:
-        if not db.tag_exists(conn, ancestor_id):
+        if ancestor_id not in tag_graph:
             errors.append(f"Ancestor tag with ID {ancestor_id} not found")
     return errors
 
@@ -40,7 +43,7 @@ def check_self_reference(conn: sqlite3.Connection, tag: Tag) -> List[str]:
 def check_cycles(conn: sqlite3.Connection, tag: Tag) -> List[str]:
     """
     Check if adding this tag would create a cycle in the tag hierarchy.
-    Uses BFS to check if any ancestor is a descendant of this tag.
+    Searches the in-memory tag graph for new ancestors that are already descendants of this tag.
     Returns list of error messages (empty if valid).
     
     Args:
@@ -48,19 +51,10 @@ def check_cycles(conn: sqlite3.Connection, tag: Tag) -> List[str]:
         tag: Tag to validate (must have an ID)
     """
     errors = []
-    
-    descendants: Set[int] = set()
-    queue: Deque[int] = deque([tag.id])
-    
-    while queue:
-        current_id = queue.popleft()
-        if current_id in descendants:
-            continue
-        descendants.add(current_id)
-        
-        for child_id in db.get_direct_descendants_ids(conn, current_id):
-            if child_id not in descendants:
-                queue.append(child_id)
+    if tag.id is None or not tag.direct_ancestors:
+        return errors
+
+    descendants = graph.get_graph(conn).descendants_among(tag.id, tag.direct_ancestors)
     
     for ancestor in tag.direct_ancestors:
         if ancestor in descendants:
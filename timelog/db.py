@@ -1,29 +1,43 @@
+from collections import defaultdict
 import datetime
+from itertools import islice
 import sqlite3
 import pandas as pd
 from pathlib import Path
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple, Union
 
+from common import connection
+from common.migrations import apply_migrations
+from tags import db as tags_db
+from . import migrations
+from .entry_filter import EntryFilter, sql_datetime
 from .timelog_entry import TimeLogEntry
 
-def get_db(db_path: Path):
-    conn = sqlite3.connect(db_path)
-    conn.row_factory = sqlite3.Row
-    return conn
+def get_db(db_path: Path) -> sqlite3.Connection:
+    """
+    Return the pooled connection to db_path (see common.connection).
+    Use it as a context manager to commit or roll back; do not close it.
+    """
+    return connection.get_connection(db_path)
 
 def init_db(db_path: Path):
-    conn = get_db(db_path)
-    conn.execute("""
-        CREATE TABLE IF NOT EXISTS time_logs (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            start DATETIME NOT NULL,
-            duration_seconds INTEGER NOT NULL,
-            tags TEXT NOT NULL,
-            description TEXT NOT NULL,
-            last_updated TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-        )
-    """)
-    conn.commit()
-    conn.close()
+    """
+    Create the time_logs table and bring the schema up to the latest migration.
+    Entry tags reference the tags package tables, which are created in the same database.
+    """
+    with get_db(db_path) as conn:
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS time_logs (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                start DATETIME NOT NULL,
+                duration_seconds INTEGER NOT NULL,
+                tags TEXT NOT NULL,
+                description TEXT NOT NULL,
+                last_updated TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            )
+        """)
+        tags_db.init_db(conn)
+        apply_migrations(conn, "timelog", migrations.TIMELOG_MIGRATIONS)
 
 def row_to_entry(row) -> TimeLogEntry:
     return TimeLogEntry(
@@ -35,31 +49,432 @@ def row_to_entry(row) -> TimeLogEntry:
         last_updated=row["last_updated"]
     )
 
+INSERT_ENTRY_SQL = "INSERT INTO time_logs (start, duration_seconds, tags, description) VALUES (?, ?, ?, ?)"
+
+def entry_to_row(entry: TimeLogEntry) -> tuple:
+    # Whole seconds, like the CSV timestamps: end_time is computed with SQLite's
+    # datetime(), which drops fractions, and is compared as text with start.
+    start = entry.start.replace(microsecond=0) if isinstance(entry.start, datetime.datetime) else entry.start
+    return (start, round(entry.duration.total_seconds()), " ".join(entry.tags), entry.description)
+
 def add_entry(db_path: Path, entry: TimeLogEntry): 
+    with get_db(db_path) as conn:
+        name_to_id = resolve_tag_ids(conn, entry.tags)
+        cursor = conn.execute(INSERT_ENTRY_SQL, entry_to_row(entry))
+        _index_entries(conn, [(cursor.lastrowid, entry)], name_to_id)
+
+def add_entries(
+    db_path: Path,
+    entries: Iterable[TimeLogEntry],
+    batch_size: int = 10_000,
+    skip_duplicates: bool = False
+) -> int:
+    """
+    Insert many entries, batch_size rows per executemany and per transaction.
+    
+    entries is consumed lazily, so it can be a generator streaming from a file.
+    With skip_duplicates, entries identical (start, duration, tags, description)
+    to a stored one or to an earlier one of the same call are left out, which
+    makes re-ingesting the same data idempotent.
+    Returns the number of entries inserted.
+    """
     conn = get_db(db_path)
-    conn.execute(
-        "INSERT INTO time_logs (start, duration_seconds, tags, description) VALUES (?, ?, ?, ?)",
-        (entry.start, entry.duration.total_seconds(), " ".join(entry.tags), entry.description)
+    entries = iter(entries)
+    added = 0
+    while True:
+        batch = list(islice(entries, batch_size))
+        if not batch:
+            break
+        with conn:
+            if skip_duplicates:
+                batch = _without_duplicates(conn, batch)
+                if not batch:
+                    continue
+            name_to_id = resolve_tag_ids(conn, (name for entry in batch for name in entry.tags))
+            conn.executemany(INSERT_ENTRY_SQL, [entry_to_row(entry) for entry in batch])
+            # The batch is written inside one write transaction, so its rows got
+            # consecutive ids ending at the current maximum.
+            last_id = conn.execute("SELECT MAX(id) FROM time_logs").fetchone()[0]
+            first_id = last_id - len(batch) + 1
+            _index_entries(conn, [(first_id + offset, entry) for offset, entry in enumerate(batch)], name_to_id)
+        added += len(batch)
+    return added
+
+def _entry_key(start, duration_seconds, tags: str, description: str) -> tuple:
+    if isinstance(start, datetime.datetime):
+        start = start.isoformat(sep=" ")
+    return (str(start), duration_seconds, tags, description)
+
+def _without_duplicates(conn: sqlite3.Connection, batch: List[TimeLogEntry]) -> List[TimeLogEntry]:
+    """Drop the entries of batch already stored, or repeated within batch. Uses the start index."""
+    rows = [entry_to_row(entry) for entry in batch]
+    starts = list({_entry_key(*row)[0] for row in rows})
+    seen = set()
+    for chunk_start in range(0, len(starts), 500):
+        chunk = starts[chunk_start:chunk_start + 500]
+        placeholders = ",".join("?" * len(chunk))
+        cursor = conn.execute(
+            f"SELECT start, duration_seconds, tags, description FROM time_logs WHERE start IN ({placeholders})", chunk
+        )
+        seen.update(_entry_key(*row) for row in cursor)
+
+    unique = []
+    for entry, row in zip(batch, rows):
+        key = _entry_key(*row)
+        if key not in seen:
+            seen.add(key)
+            unique.append(entry)
+    return unique
+
+# -- Tags --
+
+def resolve_tag_ids(conn: sqlite3.Connection, names: Iterable[str]) -> Dict[str, int]:
+    """
+    Map tag names to their ids in the tags package, creating (as root tags)
+    the names that do not exist yet. Writers call it before inserting entries,
+    so the lookup runs outside the write transaction and can fill the tags
+    cache when it is enabled.
+    """
+    names = {name for name in names if name}
+    name_to_id = {name: tag.id for name, tag in tags_db.get_tags_by_names(conn, names).items()}
+
+    missing = [name for name in names if name not in name_to_id]
+    if missing:
+        name_to_id.update(tags_db.insert_tags(conn, missing))
+    return name_to_id
+
+def link_entry_tags(
+    conn: sqlite3.Connection,
+    entry_tags: List[Tuple[int, List[str]]],
+    name_to_id: Optional[Dict[str, int]] = None
+) -> Dict[str, int]:
+    """
+    Record in time_log_tags the tags of each (entry id, tag names) pair.
+    name_to_id may already map every name involved; otherwise names are resolved here.
+    Returns the id of every tag name involved.
+    """
+    if name_to_id is None:
+        name_to_id = resolve_tag_ids(conn, (name for _, names in entry_tags for name in names))
+    conn.executemany(
+        "INSERT OR IGNORE INTO time_log_tags (entry_id, tag_id) VALUES (?, ?)",
+        (
+            (entry_id, name_to_id[name])
+            for entry_id, names in entry_tags
+            for name in names
+            if name
+        )
     )
-    conn.commit()
-    conn.close()
+    return name_to_id
 
-def query_all_entries(db_path: Path) -> pd.DataFrame:
-    conn = get_db(db_path)
-    df = pd.read_sql_query("SELECT * FROM time_logs", conn)
-    conn.close()
+def _index_entries(conn: sqlite3.Connection, entries: List[Tuple[int, TimeLogEntry]], name_to_id: Dict[str, int]):
+    """Link freshly inserted (id, entry) pairs to their tags and add them to the time buckets."""
+    link_entry_tags(conn, [(entry_id, entry.tags) for entry_id, entry in entries], name_to_id)
+    add_to_buckets(conn, (
+        (name_to_id[name], entry.start, entry.duration.total_seconds())
+        for _, entry in entries
+        for name in set(entry.tags)
+        if name
+    ))
+
+# -- Time buckets --
+#
+# tag_daily_totals and tag_weekly_totals hold the duration and number of entries
+# of every tag per day and per ISO week of the entry start. They are updated on
+# every insert and can be rebuilt from time_logs with rebuild_buckets.
+
+BUCKET_TABLES = {"day": "tag_daily_totals", "week": "tag_weekly_totals"}
+
+def _as_datetime(start) -> datetime.datetime:
+    if isinstance(start, datetime.datetime):
+        return start
+    return datetime.datetime.fromisoformat(str(start))
+
+def _iso_week(day: datetime.date) -> str:
+    year, week, _ = day.isocalendar()
+    return f"{year}-W{week:02d}"
+
+def _upsert_buckets(conn: sqlite3.Connection, table: str, totals: Dict[Tuple[int, str], List[int]]):
+    conn.executemany(
+        f"""
+        INSERT INTO {table} (tag_id, bucket, duration_seconds, entry_count) VALUES (?, ?, ?, ?)
+        ON CONFLICT (tag_id, bucket) DO UPDATE SET
+            duration_seconds = duration_seconds + excluded.duration_seconds,
+            entry_count = entry_count + excluded.entry_count
+        """,
+        ((tag_id, bucket, duration, count) for (tag_id, bucket), (duration, count) in totals.items())
+    )
+
+def add_to_buckets(conn: sqlite3.Connection, tag_entries: Iterable[Tuple[int, object, float]]):
+    """Add (tag id, entry start, duration in seconds) triples to the daily and weekly totals."""
+    daily: Dict[Tuple[int, str], List[int]] = defaultdict(lambda: [0, 0])
+    weekly: Dict[Tuple[int, str], List[int]] = defaultdict(lambda: [0, 0])
+    for tag_id, start, duration_seconds in tag_entries:
+        day = _as_datetime(start).date()
+        for totals, bucket in ((daily, day.isoformat()), (weekly, _iso_week(day))):
+            totals[tag_id, bucket][0] += round(duration_seconds)
+            totals[tag_id, bucket][1] += 1
+    _upsert_buckets(conn, BUCKET_TABLES["day"], daily)
+    _upsert_buckets(conn, BUCKET_TABLES["week"], weekly)
+
+def fill_buckets(conn: sqlite3.Connection):
+    """Recompute both bucket tables from time_logs and time_log_tags."""
+    conn.execute(f"DELETE FROM {BUCKET_TABLES['day']}")
+    conn.execute(f"DELETE FROM {BUCKET_TABLES['week']}")
+    conn.execute(f"""
+        INSERT INTO {BUCKET_TABLES['day']} (tag_id, bucket, duration_seconds, entry_count)
+        SELECT lt.tag_id, date(l.start), SUM(l.duration_seconds), COUNT(*)
+        FROM time_log_tags lt
+        JOIN time_logs l ON l.id = lt.entry_id
+        GROUP BY lt.tag_id, date(l.start)
+    """)
+    weekly: Dict[Tuple[int, str], List[int]] = defaultdict(lambda: [0, 0])
+    for row in conn.execute(f"SELECT tag_id, bucket, duration_seconds, entry_count FROM {BUCKET_TABLES['day']}"):
+        totals = weekly[row['tag_id'], _iso_week(datetime.date.fromisoformat(row['bucket']))]
+        totals[0] += row['duration_seconds']
+        totals[1] += row['entry_count']
+    _upsert_buckets(conn, BUCKET_TABLES["week"], weekly)
+
+def rebuild_buckets(db_path: Path):
+    with get_db(db_path) as conn:
+        fill_buckets(conn)
+
+def _bucket_of(granularity: str, moment: datetime.datetime) -> str:
+    day = moment.date()
+    return day.isoformat() if granularity == "day" else _iso_week(day)
+
+def query_bucket_totals(
+    db_path: Path,
+    granularity: str = "day",
+    since: Optional[datetime.datetime] = None,
+    until: Optional[datetime.datetime] = None,
+    tags: Optional[List[str]] = None
+) -> pd.DataFrame:
+    """
+    Per-tag totals for every day or ISO week, read from the pre-aggregated
+    bucket tables instead of scanning time_logs.
     
-    df['start'] = pd.to_datetime(df['start'])
-    df['last_updated'] = pd.to_datetime(df['last_updated'])
+    Args:
+        db_path: Path to the database
+        granularity: "day" or "week"
+        since: Keep the buckets ending after this moment
+        until: Keep the buckets starting before this moment
+        tags: Keep only the totals of these tags
+    """
+    clauses = []
+    params: list = []
+    if since is not None:
+        clauses.append("b.bucket >= ?")
+        params.append(_bucket_of(granularity, since))
+    if until is not None:
+        # until is exclusive, so a bound at midnight leaves its day out.
+        clauses.append("b.bucket <= ?")
+        params.append(_bucket_of(granularity, until - datetime.timedelta(microseconds=1)))
+    if tags:
+        clauses.append(f"t.name IN ({','.join('?' * len(tags))})")
+        params.extend(tags)
+    df = pd.read_sql_query(
+        f"""
+        SELECT b.bucket, t.name AS tag, b.entry_count, b.duration_seconds
+        FROM {BUCKET_TABLES[granularity]} b
+        JOIN tags t ON t.id = b.tag_id
+        WHERE {" AND ".join(clauses) or "1"}
+        ORDER BY b.bucket, b.duration_seconds DESC
+        """,
+        get_db(db_path),
+        params=params
+    )
+    df['total_duration'] = pd.to_timedelta(df['duration_seconds'], unit='s')
+    return df.drop(columns=['duration_seconds'])
 
-    df['duration'] = df['duration_seconds'].apply(lambda x: datetime.timedelta(seconds=x))
+def _to_entries_frame(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Convert raw time_logs rows to compact dtypes, all vectorized: datetime64 start
+    and last_updated, timedelta64 duration, and categorical tags (few distinct
+    tag combinations repeat across many entries).
+    """
+    df['start'] = pd.to_datetime(df['start'], format='ISO8601')
+    df['last_updated'] = pd.to_datetime(df['last_updated'], format='ISO8601')
+    if 'end_time' in df:
+        df['end_time'] = pd.to_datetime(df['end_time'], format='ISO8601')
+
+    df['duration'] = pd.to_timedelta(df['duration_seconds'], unit='s')
+    df['tags'] = df['tags'].astype('category')
     df = df.drop(columns=['duration_seconds'])
     
     return df
 
-def clear_all_entries(db_path: Path):
+def _read_entries(sql: str, conn: sqlite3.Connection, params: list = (), chunksize: Optional[int] = None):
+    if chunksize is None:
+        return _to_entries_frame(pd.read_sql_query(sql, conn, params=params))
+    return (_to_entries_frame(chunk) for chunk in pd.read_sql_query(sql, conn, params=params, chunksize=chunksize))
+
+def query_all_entries(db_path: Path, chunksize: Optional[int] = None) -> Union[pd.DataFrame, Iterator[pd.DataFrame]]:
+    """
+    All entries as one DataFrame, or as an iterator of DataFrames of chunksize rows
+    each when chunksize is given.
+    """
+    return _read_entries("SELECT * FROM time_logs", get_db(db_path), chunksize=chunksize)
+
+def query_entries(
+    db_path: Path,
+    entry_filter: Optional[EntryFilter] = None,
+    chunksize: Optional[int] = None
+) -> Union[pd.DataFrame, Iterator[pd.DataFrame]]:
+    """
+    Entries matching entry_filter, filtered in SQL through the start and
+    time_log_tags indexes rather than in pandas. With chunksize, returns an
+    iterator of DataFrames of that many rows.
+    """
+    where, params = (entry_filter or EntryFilter()).to_sql()
+    return _read_entries(f"SELECT l.* FROM time_logs l WHERE {where}", get_db(db_path), params, chunksize)
+
+def query_entries_with_tag(db_path: Path, tag_name: str) -> pd.DataFrame:
+    """Entries carrying exactly the tag tag_name, found through the time_log_tags index."""
+    return _read_entries(
+        """
+        SELECT l.*
+        FROM tags t
+        JOIN time_log_tags lt ON lt.tag_id = t.id
+        JOIN time_logs l ON l.id = lt.entry_id
+        WHERE t.name = ?
+        """,
+        get_db(db_path),
+        (tag_name,)
+    )
+
+def query_tag_totals(db_path: Path) -> pd.DataFrame:
+    """Number of entries and total duration of every tag, as one indexed join."""
+    df = pd.read_sql_query(
+        """
+        SELECT t.name AS tag, COUNT(*) AS entry_count, SUM(l.duration_seconds) AS total_seconds
+        FROM time_log_tags lt
+        JOIN tags t ON t.id = lt.tag_id
+        JOIN time_logs l ON l.id = lt.entry_id
+        GROUP BY lt.tag_id
+        ORDER BY total_seconds DESC
+        """,
+        get_db(db_path)
+    )
+    df['total_duration'] = pd.to_timedelta(df['total_seconds'], unit='s')
+    return df.drop(columns=['total_seconds'])
+
+def query_rollup_totals(db_path: Path, entry_filter: Optional[EntryFilter] = None) -> pd.DataFrame:
+    """
+    Number of entries and total duration of every tag, including the entries
+    logged under any of its descendants in the tags hierarchy.
+    
+    Ancestors come from the precomputed closure in tag_relationships, and each
+    entry is counted once per ancestor however many paths lead to it.
+    Only entries matching entry_filter are counted.
+    """
+    where, params = (entry_filter or EntryFilter()).to_sql()
+    df = pd.read_sql_query(
+        f"""
+        WITH entry_rollup_tags AS (
+            SELECT lt.entry_id, lt.tag_id
+            FROM time_log_tags lt
+            UNION
+            SELECT lt.entry_id, r.parent_tag_id
+            FROM time_log_tags lt
+            JOIN tag_relationships r ON r.child_tag_id = lt.tag_id
+        )
+        SELECT t.name AS tag, COUNT(*) AS entry_count, SUM(l.duration_seconds) AS total_seconds
+        FROM entry_rollup_tags ert
+        JOIN tags t ON t.id = ert.tag_id
+        JOIN time_logs l ON l.id = ert.entry_id
+        WHERE {where}
+        GROUP BY ert.tag_id
+        ORDER BY total_seconds DESC
+        """,
+        get_db(db_path),
+        params=params
+    )
+    df['total_duration'] = pd.to_timedelta(df['total_seconds'], unit='s')
+    return df.drop(columns=['total_seconds'])
+
+# -- Intervals --
+#
+# Every entry covers [start, end_time). Entries overlapping a window are found
+# through idx_time_logs_interval: an entry ending after the window opens cannot
+# start more than the longest duration before it, which bounds the index range.
+
+def _max_duration(conn: sqlite3.Connection) -> datetime.timedelta:
+    max_seconds = conn.execute("SELECT MAX(duration_seconds) FROM time_logs").fetchone()[0]
+    return datetime.timedelta(seconds=max_seconds or 0)
+
+def query_entries_at(db_path: Path, when: datetime.datetime) -> pd.DataFrame:
+    """Entries in progress at when: started at or before it and not yet ended."""
     conn = get_db(db_path)
-    conn.execute("DELETE FROM time_logs")
-    conn.commit()
-    conn.close()
+    return _read_entries(
+        "SELECT l.* FROM time_logs l WHERE l.start <= ? AND l.start >= ? AND l.end_time > ? ORDER BY l.start",
+        conn,
+        (sql_datetime(when), sql_datetime(when - _max_duration(conn)), sql_datetime(when))
+    )
+
+def query_entries_overlapping(db_path: Path, start: datetime.datetime, end: datetime.datetime) -> pd.DataFrame:
+    """Entries sharing any time with [start, end), e.g. what was logged between 14:00 and 16:00."""
+    conn = get_db(db_path)
+    return _read_entries(
+        "SELECT l.* FROM time_logs l WHERE l.start < ? AND l.start >= ? AND l.end_time > ? ORDER BY l.start",
+        conn,
+        (sql_datetime(end), sql_datetime(start - _max_duration(conn)), sql_datetime(start))
+    )
 
+def _query_consecutive(db_path: Path, condition: str, entry_filter: Optional[EntryFilter]) -> pd.DataFrame:
+    """
+    Entries matching entry_filter, by start, where condition holds between the
+    entry and previous_end, the latest end of all the entries that start before it
+    (an entry may end after the ones that follow it). Scans idx_time_logs_interval in order.
+    """
+    where, params = (entry_filter or EntryFilter()).to_sql()
+    df = pd.read_sql_query(
+        f"""
+        WITH consecutive AS (
+            SELECT
+                l.id, l.start, l.end_time,
+                MAX(l.end_time) OVER (
+                    ORDER BY l.start ROWS BETWEEN UNBOUNDED PRECEDING AND 1 PRECEDING
+                ) AS previous_end
+            FROM time_logs l
+            WHERE {where}
+        )
+        SELECT
+            previous_end, id, start, end_time,
+            CAST(strftime('%s', start) AS INTEGER) - CAST(strftime('%s', previous_end) AS INTEGER) AS gap_seconds
+        FROM consecutive
+        WHERE {condition}
+        ORDER BY start
+        """,
+        get_db(db_path),
+        params=params
+    )
+    for column in ('previous_end', 'start', 'end_time'):
+        df[column] = pd.to_datetime(df[column], format='ISO8601')
+    df['gap'] = pd.to_timedelta(df['gap_seconds'], unit='s')
+    return df.drop(columns=['gap_seconds'])
+
+def query_overlaps(db_path: Path, entry_filter: Optional[EntryFilter] = None) -> pd.DataFrame:
+    """
+    Entries starting before an earlier entry (by start) has ended.
+    gap is negative: minus the time between the entry's start and previous_end.
+    """
+    return _query_consecutive(db_path, "start < previous_end", entry_filter)
+
+def query_gaps(
+    db_path: Path,
+    min_gap: datetime.timedelta = datetime.timedelta(0),
+    entry_filter: Optional[EntryFilter] = None
+) -> pd.DataFrame:
+    """Untracked stretches longer than min_gap before an entry's start, during which no earlier entry is running."""
+    return _query_consecutive(
+        db_path,
+        f"previous_end IS NOT NULL AND gap_seconds > {int(min_gap.total_seconds())}",
+        entry_filter
+    )
+
+def clear_all_entries(db_path: Path):
+    with get_db(db_path) as conn:
+        conn.execute("DELETE FROM time_log_tags")
+        conn.execute("DELETE FROM time_logs")
+        for table in BUCKET_TABLES.values():
+            conn.execute(f"DELETE FROM {table}")
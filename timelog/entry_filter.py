@@ -0,0 +1,69 @@
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import List, Optional, Tuple
+
+import pandas as pd
+
+
+@dataclass
+class EntryFilter:
+    """
+    Selection of time-log entries, compiled to a parameterized WHERE clause over
+    time_logs (aliased as l) so that filtering happens inside SQLite.
+    
+    - start / end: entries whose start is in [start, end)
+    - include_tags: entries carrying at least one of these tags
+    - exclude_tags: entries carrying none of these tags
+    - search: substring of the description (case-insensitive for ASCII)
+    """
+    start: Optional[datetime] = None
+    end: Optional[datetime] = None
+    include_tags: List[str] = field(default_factory=list)
+    exclude_tags: List[str] = field(default_factory=list)
+    search: Optional[str] = None
+
+    def to_sql(self) -> Tuple[str, list]:
+        """Return (where_clause, params); the clause is "1" when nothing is filtered."""
+        clauses = []
+        params: list = []
+        if self.start is not None:
+            clauses.append("l.start >= ?")
+            params.append(sql_datetime(self.start))
+        if self.end is not None:
+            clauses.append("l.start < ?")
+            params.append(sql_datetime(self.end))
+        for operator, names in (("IN", self.include_tags), ("NOT IN", self.exclude_tags)):
+            if names:
+                placeholders = ",".join("?" * len(names))
+                clauses.append(
+                    f"l.id {operator} (SELECT lt.entry_id FROM time_log_tags lt "
+                    f"JOIN tags t ON t.id = lt.tag_id WHERE t.name IN ({placeholders}))"
+                )
+                params.extend(names)
+        if self.search:
+            escaped = self.search.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+            clauses.append("l.description LIKE ? ESCAPE '\\'")
+            params.append(f"%{escaped}%")
+        return (" AND ".join(clauses) or "1"), params
+
+    def mask(self, df: pd.DataFrame) -> pd.Series:
+        """Boolean mask of the rows of an entries DataFrame that match, for data already out of SQLite."""
+        mask = pd.Series(True, index=df.index)
+        if self.start is not None:
+            mask &= df['start'] >= self.start
+        if self.end is not None:
+            mask &= df['start'] < self.end
+        if self.include_tags or self.exclude_tags:
+            entry_tags = df['tags'].str.split()
+            if self.include_tags:
+                mask &= entry_tags.map(lambda tags: not set(self.include_tags).isdisjoint(tags)).astype(bool)
+            if self.exclude_tags:
+                mask &= entry_tags.map(lambda tags: set(self.exclude_tags).isdisjoint(tags)).astype(bool)
+        if self.search:
+            mask &= df['description'].str.contains(self.search, case=False, regex=False)
+        return mask
+
+
+def sql_datetime(value: datetime) -> str:
+    """Format like the default sqlite3 datetime adapter, which is how start is stored."""
+    return value.isoformat(sep=" ")
@@ -0,0 +1,31 @@
+import argparse
+from pathlib import Path
+
+from .. import snapshot
+
+def parse_args():
+    p = argparse.ArgumentParser(description="Append new time-log entries to a columnar snapshot")
+    p.add_argument(
+        "--db-path", dest="db_path", 
+        type=Path, required=True,
+        help="The path to the database file",
+    )
+    p.add_argument(
+        "--snapshot-dir", dest="snapshot_dir",
+        type=Path, required=True,
+        help="The snapshot directory (created on first export)",
+    )
+    p.add_argument(
+        "--format", dest="fmt",
+        choices=snapshot.FORMATS, default=None,
+        help="Part format for a new snapshot (default: feather if pyarrow is installed, else numpy)",
+    )
+    return p.parse_args()
+
+def main():
+    args = parse_args()
+    appended = snapshot.export_snapshot(args.db_path, args.snapshot_dir, args.fmt)
+    print(f"Appended {appended} entries to {args.snapshot_dir}")
+
+if __name__ == "__main__":
+    main()
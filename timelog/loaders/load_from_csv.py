@@ -1,10 +1,19 @@
 import argparse
+from concurrent.futures import ProcessPoolExecutor
 import csv
 import datetime
+import glob
+import os
 from pathlib import Path
+from typing import Iterator, List, Tuple
 
+import pandas as pd
+
+from common import instrument
 from .. import db, timelog_entry
 
+TIMESTAMP_FORMAT = "%Y-%m-%d %H:%M:%S"
+
 def parse_args():
     p = argparse.ArgumentParser()
 
@@ -15,28 +24,116 @@ def parse_args():
     )
 
     p.add_argument(
-        "--csv-file", dest="csv_file",
-        type=Path, required=True,
-        help="The CSV file to load"
+        "--csv-file", dest="csv_files",
+        nargs="+", required=True,
+        help="The CSV files to load: paths, glob patterns, or directories (all *.csv inside)"
+    )
+
+    p.add_argument(
+        "--batch-size", dest="batch_size",
+        type=int, default=10_000,
+        help="Number of entries inserted per transaction"
+    )
+
+    p.add_argument(
+        "--workers", dest="workers",
+        type=int, default=os.cpu_count(),
+        help="Number of processes parsing files in parallel"
+    )
+
+    p.add_argument(
+        "--allow-duplicates", dest="allow_duplicates",
+        action="store_true",
+        help="Insert entries even if an identical one (start, duration, tags, description) exists"
     )
     
+    instrument.add_profile_argument(p)
     return p.parse_args()
 
+def expand_csv_paths(patterns: List[str]) -> List[Path]:
+    paths: List[Path] = []
+    for pattern in patterns:
+        path = Path(pattern)
+        if path.is_dir():
+            paths.extend(sorted(path.glob("*.csv")))
+        elif glob.has_magic(pattern):
+            paths.extend(Path(match) for match in sorted(glob.glob(pattern)))
+        else:
+            paths.append(path)
+    return paths
+
+def parse_file(csv_file: Path) -> Tuple[List[timelog_entry.TimeLogEntry], List[str]]:
+    """
+    Parse and validate one CSV file, converting timestamps and durations in
+    vectorized passes. Rows that fail to parse are skipped and described in the
+    returned errors, prefixed with the file and line number.
+    """
+    errors: List[Tuple[int, str]] = []
+    line_numbers: List[int] = []
+    rows: List[List[str]] = []
+    with csv_file.open(newline='') as f:
+        for line_number, row in enumerate(csv.reader(f), start=1):
+            if len(row) < 4:
+                errors.append((line_number, f"expected 4 columns, got {len(row)}"))
+                continue
+            line_numbers.append(line_number)
+            rows.append(row[:4])
+
+    frame = pd.DataFrame(rows, columns=['start', 'duration_seconds', 'tags', 'description'], dtype=object)
+    starts = pd.to_datetime(frame['start'], format=TIMESTAMP_FORMAT, errors='coerce')
+    durations = pd.to_numeric(frame['duration_seconds'], errors='coerce')
+    invalid = starts.isna() | durations.isna() | (durations % 1 != 0)
+    for index in invalid[invalid].index:
+        errors.append((line_numbers[index], f"invalid start '{rows[index][0]}' or duration '{rows[index][1]}'"))
+
+    valid = ~invalid
+    entries = [
+        timelog_entry.TimeLogEntry(
+            start=start.to_pydatetime(),
+            duration=datetime.timedelta(seconds=int(duration)),
+            tags=tags.split(" "),
+            description=description,
+        )
+        for start, duration, tags, description in zip(
+            starts[valid], durations[valid], frame['tags'][valid], frame['description'][valid]
+        )
+    ]
+    return entries, [f"{csv_file}:{line_number}: {message}" for line_number, message in sorted(errors)]
+
+def parse_files(csv_files: List[Path], workers: int, errors: List[str]) -> Iterator[timelog_entry.TimeLogEntry]:
+    """
+    Parse csv_files in a pool of worker processes and stream their entries, in
+    file order, to the caller (the single writer). Parse errors go to errors.
+    """
+    if workers <= 1 or len(csv_files) <= 1:
+        results = map(parse_file, csv_files)
+        for entries, file_errors in results:
+            errors.extend(file_errors)
+            yield from entries
+        return
+
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        for entries, file_errors in executor.map(parse_file, csv_files):
+            errors.extend(file_errors)
+            yield from entries
+
 def main():
     args = parse_args()
-    
-    csv_reader = csv.reader(args.csv_file.open())
-    added_entries = 0
-    for row in csv_reader:
-        start = datetime.datetime.strptime(row[0], "%Y-%m-%d %H:%M:%S")
-        duration = datetime.timedelta(seconds=int(row[1]))
-        tags = row[2].split(" ")
-        description = row[3]
-        entry = timelog_entry.TimeLogEntry(start=start, duration=duration, tags=tags, description=description)
-        db.add_entry(args.db_path, entry)
-        added_entries += 1
-
-    print(f"Loaded {added_entries} entries")
+    with instrument.profiling(args.profile):
+        csv_files = expand_csv_paths(args.csv_files)
+        errors: List[str] = []
+        added_entries = db.add_entries(
+            args.db_path,
+            parse_files(csv_files, args.workers, errors),
+            batch_size=args.batch_size,
+            skip_duplicates=not args.allow_duplicates,
+        )
+
+        print(f"Loaded {added_entries} entries from {len(csv_files)} files")
+        if errors:
+            print(f"Skipped {len(errors)} rows:")
+            for error in errors:
+                print(f"  - {error}")
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
@@ -0,0 +1,21 @@
+import argparse
+from pathlib import Path
+
+from .. import db
+
+def parse_args():
+    p = argparse.ArgumentParser(description="Recompute the daily and weekly per-tag totals from all entries")
+    p.add_argument(
+        "--db-path", dest="db_path", 
+        type=Path, required=True,
+        help="The path to the database file",
+    )
+    return p.parse_args()
+
+def main():
+    args = parse_args()
+    db.rebuild_buckets(args.db_path)
+    print("Rebuilt time buckets")
+
+if __name__ == "__main__":
+    main()
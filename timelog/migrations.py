@@ -0,0 +1,94 @@
+"""
+Versioned schema migrations of the timelog package, applied by init_db.
+See common.migrations for how versions are tracked.
+"""
+import sqlite3
+from typing import List
+
+from common.migrations import Migration
+from . import db
+
+BACKFILL_BATCH_SIZE = 10_000
+
+
+def add_time_log_tags(conn: sqlite3.Connection):
+    """
+    Link entries to the tags package through a time_log_tags join table, and
+    move the space-separated tags of existing entries over to it.
+    """
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS time_log_tags (
+            entry_id INTEGER NOT NULL REFERENCES time_logs(id),
+            tag_id INTEGER NOT NULL REFERENCES tags(id),
+            PRIMARY KEY (entry_id, tag_id)
+        ) WITHOUT ROWID
+    """)
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_time_log_tags_tag ON time_log_tags (tag_id, entry_id)")
+
+    cursor = conn.execute("SELECT id, tags FROM time_logs")
+    while True:
+        rows = cursor.fetchmany(BACKFILL_BATCH_SIZE)
+        if not rows:
+            break
+        db.link_entry_tags(conn, [(row['id'], row['tags'].split()) for row in rows])
+
+
+def add_time_buckets(conn: sqlite3.Connection):
+    """Pre-aggregated per-tag totals by day and by ISO week, filled from the existing entries."""
+    for table in db.BUCKET_TABLES.values():
+        conn.execute(f"""
+            CREATE TABLE IF NOT EXISTS {table} (
+                tag_id INTEGER NOT NULL REFERENCES tags(id),
+                bucket TEXT NOT NULL,
+                duration_seconds INTEGER NOT NULL,
+                entry_count INTEGER NOT NULL,
+                PRIMARY KEY (tag_id, bucket)
+            ) WITHOUT ROWID
+        """)
+        conn.execute(f"CREATE INDEX IF NOT EXISTS idx_{table}_bucket ON {table} (bucket, tag_id)")
+    db.fill_buckets(conn)
+
+
+def add_start_index(conn: sqlite3.Connection):
+    """Lets date-range filters read only the matching window of time_logs."""
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_time_logs_start ON time_logs (start)")
+
+
+def add_end_time(conn: sqlite3.Connection):
+    """
+    A computed end_time column and an index on (start, end_time) for interval
+    queries, plus an index on duration_seconds so the longest entry (which bounds
+    how far before a window an overlapping entry can start) is found without a scan.
+    The (start, end_time) index covers every lookup idx_time_logs_start served.
+    """
+    conn.execute("""
+        ALTER TABLE time_logs ADD COLUMN end_time TEXT
+        GENERATED ALWAYS AS (datetime(start, '+' || duration_seconds || ' seconds')) VIRTUAL
+    """)
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_time_logs_interval ON time_logs (start, end_time)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_time_logs_duration ON time_logs (duration_seconds)")
+    conn.execute("DROP INDEX IF EXISTS idx_time_logs_start")
+
+
+def truncate_to_seconds(conn: sqlite3.Connection):
+    """
+    Drop the fractional seconds of starts and durations written before inserts
+    normalised them, so that end_time (computed with datetime(), which drops
+    fractions) is exact and compares as text with the start of other entries.
+    The bucket tables were filled from the old durations, so they are recomputed.
+    """
+    conn.execute("""
+        UPDATE time_logs
+        SET start = datetime(start), duration_seconds = CAST(ROUND(duration_seconds) AS INTEGER)
+        WHERE start != datetime(start) OR typeof(duration_seconds) != 'integer'
+    """)
+    db.fill_buckets(conn)
+
+
+TIMELOG_MIGRATIONS: List[Migration] = [
+    add_time_log_tags,
+    add_time_buckets,
+    add_start_index,
+    add_end_time,
+    truncate_to_seconds,
+]
@@ -1,8 +1,11 @@
 import argparse
+import datetime
 import pandas as pd
 from pathlib import Path
 
-from . import db, timelog_entry
+from common import instrument
+from . import db, snapshot, timelog_entry
+from .entry_filter import EntryFilter
 
 def parse_args():
     p = argparse.ArgumentParser()
@@ -11,26 +14,123 @@ def parse_args():
         type=Path, required=True,
         help="The path to the database file",
     )
-    return p.parse_args()
+    p.add_argument(
+        "--rollup", dest="rollup",
+        action="store_true",
+        help="Include in each tag's totals the time logged under its descendant tags",
+    )
+    p.add_argument(
+        "--buckets", dest="buckets",
+        choices=db.BUCKET_TABLES, default=None,
+        help="Report per-tag totals per day or ISO week from the pre-aggregated tables; "
+             "--since/--until/--last-days keep whole buckets and --tag keeps those tags' totals",
+    )
+    p.add_argument(
+        "--snapshot", dest="snapshot_dir",
+        type=Path, default=None,
+        help="Read entries from this columnar snapshot instead of the database",
+    )
+    p.add_argument(
+        "--since", dest="since",
+        type=datetime.datetime.fromisoformat, default=None,
+        help="Only count entries starting at or after this date/time (ISO format)",
+    )
+    p.add_argument(
+        "--until", dest="until",
+        type=datetime.datetime.fromisoformat, default=None,
+        help="Only count entries starting before this date/time (ISO format)",
+    )
+    p.add_argument(
+        "--last-days", dest="last_days",
+        type=int, default=None,
+        help="Only count entries from the last N days (overrides --since)",
+    )
+    p.add_argument(
+        "--tag", dest="tags",
+        action="append", default=[],
+        help="Only count entries carrying this tag (repeatable; any of them matches)",
+    )
+    p.add_argument(
+        "--exclude-tag", dest="exclude_tags",
+        action="append", default=[],
+        help="Skip entries carrying this tag (repeatable)",
+    )
+    p.add_argument(
+        "--search", dest="search",
+        default=None,
+        help="Only count entries whose description contains this text",
+    )
+    instrument.add_profile_argument(p)
+    args = p.parse_args()
+    if args.buckets and (args.exclude_tags or args.search):
+        # The bucket tables hold per-tag sums, which cannot tell which entries to leave out.
+        p.error("--buckets cannot be combined with --exclude-tag or --search")
+    if args.snapshot_dir is not None and (args.rollup or args.buckets):
+        # Both read tables the snapshot does not carry (tag hierarchy, bucket totals).
+        p.error("--snapshot cannot be combined with --rollup or --buckets")
+    return args
+
+def entry_filter_from_args(args) -> EntryFilter:
+    since = args.since
+    if args.last_days is not None:
+        since = datetime.datetime.now() - datetime.timedelta(days=args.last_days)
+    return EntryFilter(
+        start=since,
+        end=args.until,
+        include_tags=args.tags,
+        exclude_tags=args.exclude_tags,
+        search=args.search,
+    )
+
+PERCENTILES = (0.5, 0.9)
+
+def explode_tags(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Long-format view of df with one row per (entry, tag) pair and a 'tag' column.
+    The index of df is kept, and an entry listing a tag twice yields a single row.
+    """
+    long = df.drop(columns=['tags']).assign(tag=df['tags'].str.split()).explode('tag')
+    long = long[long['tag'].notna()]
+    return long[~long.set_index('tag', append=True).index.duplicated()]
 
 def by_tag_analysis(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Duration statistics per tag: total, entry count, mean and percentiles.
+    Tags are matched exactly, so 'work' does not count entries tagged 'homework'.
+    """
+    durations = explode_tags(df).groupby('tag')['duration']
 
-    all_tags = sorted(set[str](df['tags'].str.cat(sep=' ').split(' ')))
+    df_by_tags = durations.agg(total_duration='sum', count='count', mean_duration='mean')
+    percentiles = durations.quantile(list(PERCENTILES)).unstack()
+    percentiles.columns = [f"p{round(q * 100)}_duration" for q in percentiles.columns]
+    df_by_tags = df_by_tags.join(percentiles).reset_index()
 
-    def _total_time_by_tag(tag: str) -> int:
-        return df[df['tags'].str.contains(tag)]['duration'].sum()
-    
-    df_by_tags = pd.DataFrame({'tag': all_tags})
-    df_by_tags['total_duration'] = df_by_tags['tag'].apply(_total_time_by_tag)
     df_by_tags = df_by_tags.sort_values(by='total_duration', ascending=False)
     return df_by_tags
 
 def main():
     args = parse_args()
+    with instrument.profiling(args.profile):
+        entry_filter = entry_filter_from_args(args)
+
+        if args.buckets:
+            totals = db.query_bucket_totals(
+                args.db_path, args.buckets, entry_filter.start, entry_filter.end, entry_filter.include_tags
+            )
+            print(totals.to_string(index=False))
+            return
+
+        if args.rollup:
+            print(db.query_rollup_totals(args.db_path, entry_filter).to_string(index=False))
+            return
 
-    df = db.query_all_entries(args.db_path)
-    df_by_tags = by_tag_analysis(df)
-    print(df_by_tags.to_string(index=False))
+        if args.snapshot_dir is not None:
+            df = snapshot.read_snapshot(args.snapshot_dir)
+            df = df[entry_filter.mask(df)]
+        else:
+            df = db.query_entries(args.db_path, entry_filter)
+        df_by_tags = by_tag_analysis(df)
+        print(df_by_tags.to_string(index=False))
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -0,0 +1,157 @@
+"""
+Columnar snapshots of time_logs for repeated analysis outside SQLite.
+
+A snapshot is a directory of parts plus a manifest.json. Each export appends one
+part holding the entries with ids above the last exported one. Parts are
+uncompressed Feather (Arrow IPC) files when pyarrow is installed, and otherwise
+one .npy array per column, with tags dictionary-encoded against a tag list
+kept in the manifest. Both layouts are memory-mapped on read.
+"""
+import json
+import os
+from pathlib import Path
+from typing import List, Optional
+
+import numpy as np
+import pandas as pd
+
+from . import db
+
+try:
+    import pyarrow as pa
+    import pyarrow.feather as feather
+except ImportError:
+    pa = None
+
+# Every Feather part stores tags with this type, whatever the number of distinct
+# tags, so that parts can be concatenated.
+FEATHER_TAGS_TYPE = pa.dictionary(pa.int32(), pa.large_string()) if pa is not None else None
+
+FORMATS = ("feather", "numpy")
+MANIFEST = "manifest.json"
+
+
+def default_format() -> str:
+    return "feather" if pa is not None else "numpy"
+
+
+def _read_manifest(snapshot_dir: Path) -> Optional[dict]:
+    manifest_path = snapshot_dir / MANIFEST
+    if not manifest_path.exists():
+        return None
+    return json.loads(manifest_path.read_text())
+
+
+def _write_manifest(snapshot_dir: Path, manifest: dict):
+    # Write then rename, so a crash mid-export leaves the previous manifest intact.
+    tmp_path = snapshot_dir / f"{MANIFEST}.tmp"
+    tmp_path.write_text(json.dumps(manifest))
+    os.replace(tmp_path, snapshot_dir / MANIFEST)
+
+
+def export_snapshot(db_path: Path, snapshot_dir: Path, fmt: Optional[str] = None) -> int:
+    """
+    Append the entries of db_path not yet in the snapshot as a new part.
+    
+    Args:
+        db_path: Path to the database
+        snapshot_dir: Snapshot directory, created if needed
+        fmt: "feather" or "numpy"; defaults to the format of an existing snapshot,
+            else feather if pyarrow is installed
+    
+    Returns:
+        The number of entries appended
+    """
+    snapshot_dir.mkdir(parents=True, exist_ok=True)
+    manifest = _read_manifest(snapshot_dir) or {"format": fmt or default_format(), "last_id": 0, "parts": [], "tags": []}
+    if fmt is not None and fmt != manifest["format"]:
+        raise ValueError(f"Snapshot in {snapshot_dir} is in {manifest['format']} format, not {fmt}")
+    if manifest["format"] == "feather" and pa is None:
+        raise RuntimeError("Feather snapshots require the 'pyarrow' package")
+
+    df = pd.read_sql_query(
+        "SELECT id, start, duration_seconds, tags, description FROM time_logs WHERE id > ? ORDER BY id",
+        db.get_db(db_path),
+        params=(manifest["last_id"],)
+    )
+    if df.empty:
+        return 0
+    df['start'] = pd.to_datetime(df['start'], format='ISO8601').astype('datetime64[ns]')
+
+    part = f"part-{len(manifest['parts']):05d}"
+    if manifest["format"] == "feather":
+        _write_feather_part(snapshot_dir / f"{part}.feather", df)
+    else:
+        _write_numpy_part(snapshot_dir / part, df, manifest["tags"])
+
+    manifest["parts"].append(part)
+    manifest["last_id"] = int(df['id'].iloc[-1])
+    _write_manifest(snapshot_dir, manifest)
+    return len(df)
+
+
+def _write_feather_part(path: Path, df: pd.DataFrame):
+    table = pa.Table.from_pandas(df, preserve_index=False)
+    table = _cast_tags(table)
+    feather.write_feather(table, path, compression="uncompressed")
+
+
+def _cast_tags(table: "pa.Table") -> "pa.Table":
+    index = table.schema.get_field_index('tags')
+    return table.set_column(index, pa.field('tags', FEATHER_TAGS_TYPE), table.column('tags').cast(FEATHER_TAGS_TYPE))
+
+
+def _write_numpy_part(part_dir: Path, df: pd.DataFrame, tags: List[str]):
+    """Write one .npy file per column; tags are encoded as indices into tags, which is extended in place."""
+    part_dir.mkdir()
+    tag_codes = {tag: code for code, tag in enumerate(tags)}
+    for tag in df['tags'].unique():
+        if tag not in tag_codes:
+            tag_codes[tag] = len(tags)
+            tags.append(tag)
+    np.save(part_dir / "id.npy", df['id'].to_numpy(dtype=np.int64))
+    np.save(part_dir / "start.npy", df['start'].to_numpy(dtype="datetime64[ns]"))
+    np.save(part_dir / "duration_seconds.npy", df['duration_seconds'].to_numpy(dtype=np.int64))
+    np.save(part_dir / "tags.npy", df['tags'].map(tag_codes).to_numpy(dtype=np.int32))
+    (part_dir / "description.json").write_text(json.dumps(df['description'].tolist()))
+
+
+def _read_numpy_part(part_dir: Path, tags: pd.Index) -> pd.DataFrame:
+    def _load(column: str) -> np.ndarray:
+        return np.load(part_dir / f"{column}.npy", mmap_mode="r")
+
+    return pd.DataFrame({
+        'id': _load("id"),
+        'start': _load("start"),
+        'tags': pd.Categorical.from_codes(_load("tags"), categories=tags),
+        'description': json.loads((part_dir / "description.json").read_text()),
+        'duration': pd.to_timedelta(_load("duration_seconds"), unit='s'),
+    }, copy=False)
+
+
+def read_snapshot(snapshot_dir: Path) -> pd.DataFrame:
+    """
+    Load a snapshot as a DataFrame shaped like db.query_all_entries (without last_updated).
+    Parts are memory-mapped, so numeric columns are not copied into memory up front.
+    """
+    manifest = _read_manifest(snapshot_dir)
+    if manifest is None:
+        raise FileNotFoundError(f"No snapshot found in {snapshot_dir}")
+    if not manifest["parts"]:
+        return pd.DataFrame(columns=['id', 'start', 'tags', 'description', 'duration'])
+
+    if manifest["format"] == "feather":
+        if pa is None:
+            raise RuntimeError("Feather snapshots require the 'pyarrow' package")
+        # Parts written before FEATHER_TAGS_TYPE may use narrower dictionary codes.
+        table = pa.concat_tables(
+            _cast_tags(feather.read_table(snapshot_dir / f"{part}.feather", memory_map=True))
+            for part in manifest["parts"]
+        ).unify_dictionaries()
+        df = table.to_pandas(split_blocks=True, self_destruct=True)
+        df['duration'] = pd.to_timedelta(df.pop('duration_seconds'), unit='s')
+        return df
+
+    tags = pd.Index(manifest["tags"])
+    frames = [_read_numpy_part(snapshot_dir / part, tags) for part in manifest["parts"]]
+    return frames[0] if len(frames) == 1 else pd.concat(frames, ignore_index=True)
@@ -0,0 +1,193 @@
+"""
+Single-writer service for time-log entries.
+
+Many processes calling db.add_entry each open SQLite and commit on their own,
+and end up fighting over the write lock. This service owns the only writing
+connection instead: clients send entries over a Unix socket, the service
+group-commits them every max_delay_ms or max_batch entries, whichever comes
+first, and answers each client once its entries are durably committed.
+
+Protocol: newline-delimited JSON. Each request is one entry
+    {"start": "2024-01-01 10:00:00", "duration_seconds": 3600, "tags": ["work"], "description": "..."}
+and gets one response, in order: {"ok": true} or {"ok": false, "error": "..."}.
+"""
+import argparse
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+import datetime
+import json
+from pathlib import Path
+import socket
+from typing import Iterable, List, Optional, Tuple
+
+from tags import cache as tags_cache
+from . import db
+from .timelog_entry import TimeLogEntry
+
+
+def entry_from_json(data: dict) -> TimeLogEntry:
+    return TimeLogEntry(
+        start=datetime.datetime.fromisoformat(data["start"]),
+        duration=datetime.timedelta(seconds=int(data["duration_seconds"])),
+        tags=list(data["tags"]),
+        description=str(data["description"]),
+    )
+
+
+def entry_to_json(entry: TimeLogEntry) -> dict:
+    start = entry.start.isoformat(sep=" ") if isinstance(entry.start, datetime.datetime) else str(entry.start)
+    return {
+        "start": start,
+        "duration_seconds": int(entry.duration.total_seconds()),
+        "tags": list(entry.tags),
+        "description": entry.description,
+    }
+
+
+class WriterService:
+    def __init__(self, db_path: Path, max_batch: int = 1000, max_delay_ms: float = 20):
+        self.db_path = db_path
+        self.max_batch = max_batch
+        self.max_delay = max_delay_ms / 1000
+        self.queue: "asyncio.Queue[Tuple[TimeLogEntry, asyncio.Future]]" = asyncio.Queue()
+        # One thread, hence one pooled connection, does every write.
+        self.executor = ThreadPoolExecutor(max_workers=1)
+
+    def _open(self):
+        db.init_db(self.db_path)
+        # Acknowledged entries must survive a power loss, not just a process crash.
+        db.get_db(self.db_path).execute("PRAGMA synchronous = FULL")
+        # Most batches reuse the same few tag names.
+        tags_cache.enable_cache(db.get_db(self.db_path))
+
+    def _write(self, entries: List[TimeLogEntry]) -> List[Optional[str]]:
+        """Commit entries as one transaction; on failure, retry one by one to isolate the bad ones."""
+        try:
+            db.add_entries(self.db_path, entries, batch_size=len(entries))
+            return [None] * len(entries)
+        except Exception:
+            pass
+        errors = []
+        for entry in entries:
+            try:
+                db.add_entry(self.db_path, entry)
+                errors.append(None)
+            except Exception as e:
+                errors.append(str(e))
+        return errors
+
+    async def _write_batches(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self.queue.get()]
+            deadline = loop.time() + self.max_delay
+            while len(batch) < self.max_batch:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self.queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+
+            errors = await loop.run_in_executor(self.executor, self._write, [entry for entry, _ in batch])
+            for (_, future), error in zip(batch, errors):
+                if not future.done():
+                    future.set_result(error)
+
+    async def _handle_client(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        loop = asyncio.get_running_loop()
+        pending: "asyncio.Queue[asyncio.Future]" = asyncio.Queue()
+
+        async def _respond():
+            # Answer in request order, each as soon as its entry is committed.
+            while True:
+                future = await pending.get()
+                if future is None:
+                    break
+                error = await future
+                response = {"ok": True} if error is None else {"ok": False, "error": error}
+                writer.write(json.dumps(response).encode() + b"\n")
+                await writer.drain()
+
+        responder = asyncio.create_task(_respond())
+        try:
+            while line := await reader.readline():
+                future = loop.create_future()
+                try:
+                    entry = entry_from_json(json.loads(line))
+                except (ValueError, KeyError, TypeError) as e:
+                    future.set_result(f"Invalid entry: {e}")
+                else:
+                    await self.queue.put((entry, future))
+                await pending.put(future)
+            await pending.put(None)
+            await responder
+        finally:
+            responder.cancel()
+            writer.close()
+
+    async def serve(self, socket_path: Path):
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(self.executor, self._open)
+        batches = asyncio.create_task(self._write_batches())
+        server = await asyncio.start_unix_server(self._handle_client, path=str(socket_path))
+        try:
+            async with server:
+                await server.serve_forever()
+        finally:
+            batches.cancel()
+            self.executor.shutdown(wait=True)
+
+
+def submit_entries(socket_path: Path, entries: Iterable[TimeLogEntry]) -> List[Optional[str]]:
+    """
+    Send entries to a running writer service and wait until they are committed.
+    Returns one item per entry: None if it was written, else the error message.
+    """
+    entries = list(entries)
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+        sock.connect(str(socket_path))
+        sock.sendall(b"".join(json.dumps(entry_to_json(entry)).encode() + b"\n" for entry in entries))
+        sock.shutdown(socket.SHUT_WR)
+        with sock.makefile("rb") as responses:
+            results = [json.loads(responses.readline()) for _ in entries]
+    return [None if result["ok"] else result["error"] for result in results]
+
+
+def parse_args():
+    p = argparse.ArgumentParser(description="Run the group-committing time-log writer service")
+    p.add_argument(
+        "--db-path", dest="db_path", 
+        type=Path, required=True,
+        help="The path to the database file",
+    )
+    p.add_argument(
+        "--socket-path", dest="socket_path",
+        type=Path, required=True,
+        help="The Unix socket to listen on",
+    )
+    p.add_argument(
+        "--max-batch", dest="max_batch",
+        type=int, default=1000,
+        help="Commit as soon as this many entries are queued",
+    )
+    p.add_argument(
+        "--max-delay-ms", dest="max_delay_ms",
+        type=float, default=20,
+        help="Commit at the latest this many milliseconds after the first queued entry",
+    )
+    return p.parse_args()
+
+def main():
+    args = parse_args()
+    service = WriterService(args.db_path, args.max_batch, args.max_delay_ms)
+    try:
+        asyncio.run(service.serve(args.socket_path))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        args.socket_path.unlink(missing_ok=True)
+
+if __name__ == "__main__":
+    main()